@@ -1,30 +1,19 @@
 import streamlit as st
 import time
-import base64
-import json
 import hashlib
-from PIL import Image
-from pathlib import Path
+from helpers import assets, user_store
 
 
 # =================================================================================================
 # HELPER FUNCTIONS
 # =================================================================================================
-CWD = Path(__file__).resolve().parent
-USERS_FILE = CWD / "users.json"
-BG_IMAGE_FILE = CWD / "bg.gif"        # Login screen background
-AGENT_IMAGE_FILE = CWD / "AiAgent.png"  # Login agent image
-MAIN_BG_IMAGE_FILE = CWD / "M.jpg"      # Logged-in main page background
+BG_IMAGE_FILE = "bg.gif"           # Login screen background
+AGENT_IMAGE_FILE = "AiAgent.png"   # Login agent image (shown at 300px wide)
+AGENT_IMAGE_WIDTH = 600          # as listed in assets.APP_IMAGES
+MAIN_BG_IMAGE_FILE = "M.jpg"       # Logged-in main page background
 
-
-def get_base64_of_file(file_path):
-    """Convert an image file to base64 string."""
-    try:
-        with open(file_path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-    except FileNotFoundError:
-        st.warning(f"⚠️ File not found: {file_path}")
-        return ""
+# Build any background not already in ./static (python -m helpers.assets) on a background thread
+assets.preload(*assets.APP_IMAGES)
 
 
 def hash_password(password):
@@ -32,23 +21,6 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 
-def load_users():
-    """Load users from JSON file."""
-    if not USERS_FILE.exists():
-        return {}
-    with USERS_FILE.open("r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-
-def save_users(users_data):
-    """Save users to JSON file."""
-    with USERS_FILE.open("w") as f:
-        json.dump(users_data, f, indent=4)
-
-
 # =================================================================================================
 # PAGE CONFIGURATION & SESSION STATE
 # =================================================================================================
@@ -67,8 +39,8 @@ if 'feature_index' not in st.session_state:
 # =================================================================================================
 if not st.session_state.logged_in:
 
-    bg_image_base64 = get_base64_of_file(BG_IMAGE_FILE)
-    agent_image_base64 = get_base64_of_file(AGENT_IMAGE_FILE)
+    bg_image_url = assets.asset_url(BG_IMAGE_FILE)
+    agent_image_url = assets.asset_url(AGENT_IMAGE_FILE, AGENT_IMAGE_WIDTH)
 
     # --- Login screen background ---
     st.markdown(f"""
@@ -76,7 +48,7 @@ if not st.session_state.logged_in:
         [data-testid="stSidebar"], header, footer {{ visibility: hidden; }}
         .stApp {{
             background-image: linear-gradient(rgba(0, 4, 40, 0.7), rgba(0, 4, 40, 0.7)), 
-                              url("data:image/jpeg;base64,{bg_image_base64}");
+                              url("{bg_image_url}");
             background-size: cover; 
             background-position: center;
         }}
@@ -93,10 +65,10 @@ if not st.session_state.logged_in:
     col_agent, col_auth = st.columns([1, 2])
 
     with col_agent:
-        if agent_image_base64:
+        if agent_image_url:
             st.markdown(
                 f'<div style="text-align: center; padding-top: 50px;">'
-                f'<img src="data:image/png;base64,{agent_image_base64}" alt="waving agent" width="300"></div>',
+                f'<img src="{agent_image_url}" alt="waving agent" width="300"></div>',
                 unsafe_allow_html=True
             )
 
@@ -116,9 +88,8 @@ if not st.session_state.logged_in:
                 if login_button:
                     username = username.strip()
                     password = password.strip()
-                    users = load_users()
 
-                    if username in users and users[username]['password_hash'] == hash_password(password):
+                    if user_store.check_password(username, hash_password(password)):
                         st.session_state.logged_in = True
                         st.session_state.username = username
                         st.success("✅ Logged in successfully!")
@@ -136,17 +107,11 @@ if not st.session_state.logged_in:
                 signup_button = st.form_submit_button("Sign Up")
 
                 if signup_button:
-                    users = load_users()
-                    if new_username in users:
-                        st.error("⚠️ Username already exists.")
-                    elif not all([new_username, new_password, mobile_number]):
+                    if not all([new_username, new_password, mobile_number]):
                         st.warning("⚠️ Please fill in all fields.")
+                    elif not user_store.add_user(new_username, hash_password(new_password), mobile_number):
+                        st.error("⚠️ Username already exists.")
                     else:
-                        users[new_username] = {
-                            'password_hash': hash_password(new_password),
-                            'mobile_number': mobile_number
-                        }
-                        save_users(users)
                         st.session_state.logged_in = True
                         st.session_state.username = new_username
                         st.success("🎉 Account created! You are now logged in.")
@@ -159,11 +124,11 @@ if not st.session_state.logged_in:
 # =================================================================================================
 else:
     # ---- Page Background ----
-    main_bg_base64 = get_base64_of_file(MAIN_BG_IMAGE_FILE)
+    main_bg_url = assets.asset_url(MAIN_BG_IMAGE_FILE)
     st.markdown(f"""
     <style>
     .stApp {{
-        background-image: url("data:image/jpeg;base64,{main_bg_base64}");
+        background-image: url("{main_bg_url}");
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
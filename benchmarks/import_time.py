@@ -0,0 +1,121 @@
+"""Cold-start import cost of every page.
+
+Each page's import statements are read from its source (nothing is
+executed through Streamlit) and timed in fresh interpreters:
+
+* per statement, on top of an already-imported streamlit (every page pays
+  for streamlit anyway), to show what each dependency costs;
+* per page, all module-level imports together, which is what the first run
+  of the page costs. Imports inside functions or blocks are listed as
+  deferred and are only paid when that code path runs.
+
+Usage:
+    python benchmarks/import_time.py [--repeat N] [--json out.json] [--baseline old.json]
+
+With --baseline, pages whose cold-start cost grew by more than --tolerance
+(default 25%) are reported and the script exits with status 1.
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+TIMER = """
+import sys, time
+sys.path.insert(0, {app_dir!r})
+import streamlit
+start = time.perf_counter()
+{statements}
+print(time.perf_counter() - start)
+"""
+
+
+def page_files():
+    return [APP_DIR / "Home.py"] + sorted((APP_DIR / "pages").glob("*.py"))
+
+
+def collect_imports(path):
+    """Return (module-level import statements, deferred import statements) of a page."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    top_level = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    deferred = [node for node in ast.walk(tree)
+                if isinstance(node, (ast.Import, ast.ImportFrom)) and node not in top_level]
+    as_source = lambda nodes: [ast.unparse(node) for node in nodes]
+    return as_source(top_level), sorted(set(as_source(deferred)))
+
+
+def time_statements(statements, repeat):
+    """Best-of-N seconds to run the statements in a fresh interpreter."""
+    code = TIMER.format(app_dir=str(APP_DIR), statements="\n".join(statements) or "pass")
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(repeat):
+    report, statement_cost = {}, {}
+    for path in page_files():
+        top_level, deferred = collect_imports(path)
+        for statement in top_level + deferred:
+            if statement not in statement_cost:
+                statement_cost[statement] = time_statements([statement], repeat)
+        report[path.name] = {
+            "cold_start_s": time_statements(top_level, repeat),
+            "top_level": {statement: statement_cost[statement] for statement in top_level},
+            "deferred": {statement: statement_cost[statement] for statement in deferred},
+        }
+    return report
+
+
+def format_cost(seconds):
+    return "   failed" if seconds is None else f"{seconds * 1000:8.1f}ms"
+
+
+def print_report(report):
+    for page, data in report.items():
+        print(f"\n{page}: cold start {format_cost(data['cold_start_s']).strip()}")
+        for kind in ("top_level", "deferred"):
+            for statement, cost in sorted(data[kind].items(), key=lambda item: -(item[1] or 0)):
+                print(f"  {kind:9} {format_cost(cost)}  {statement}")
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for page, data in report.items():
+        old = baseline.get(page, {}).get("cold_start_s")
+        new = data["cold_start_s"]
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{page}: {old * 1000:.1f}ms -> {new * 1000:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed cold-start growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = measure(args.repeat)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=4))
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print("\nCold-start regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Unlock latency of the Document Locker's key derivation.
+
+Times one PBKDF2-SHA256 derivation (what every locker unlock pays) for a
+range of iteration counts on this machine and reports the highest count
+that stays within the latency budget. Set helpers/locker_keys.py
+KDF_ITERATIONS accordingly; existing users are rewrapped at the new cost the
+next time they unlock.
+
+Usage:
+    python benchmarks/kdf_cost.py [--budget-ms 500] [--samples 3]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from helpers import locker_keys  # noqa: E402
+
+ITERATIONS = [100_000, 200_000, 310_000, 480_000, 600_000, 800_000, 1_000_000, 1_500_000, 2_000_000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=500, help="acceptable unlock latency")
+    parser.add_argument("--samples", type=int, default=3, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    within_budget = None
+    for iterations in ITERATIONS:
+        elapsed_ms = locker_keys.time_unlock(iterations, args.samples) * 1000
+        marker = "  <- current" if iterations == locker_keys.KDF_ITERATIONS else ""
+        print(f"{iterations:>10,} iterations  {elapsed_ms:8.1f}ms{marker}")
+        if elapsed_ms <= args.budget_ms:
+            within_budget = iterations
+    if within_budget is None:
+        print(f"\nNo tested cost fits a {args.budget_ms:.0f}ms budget.")
+        sys.exit(1)
+    print(f"\nHighest tested cost within {args.budget_ms:.0f}ms: {within_budget:,} iterations")
+
+
+if __name__ == "__main__":
+    main()
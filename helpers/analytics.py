@@ -0,0 +1,170 @@
+"""Cross-user plan analytics for staff.
+
+All users' plans are flattened into one task table (username, task id,
+date, priority, done) kept as analytics/plans.parquet. A refresh only
+re-reads users whose plan files changed since the last one (by mtime and
+size, recorded in analytics/plans_state.json); when many did, they are read
+on a process pool. Metrics are computed on the columnar table with
+vectorized pandas operations.
+
+Command line:
+    python -m helpers.analytics [--workers N] [--out DIR]
+"""
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers import plan_store, storage
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DIR = "analytics"
+DATASET_PATH = os.path.join(ANALYTICS_DIR, "plans.parquet")
+STATE_PATH = os.path.join(ANALYTICS_DIR, "plans_state.json")
+COLUMNS = ["username", "task_id", "date", "priority", "done"]
+PARALLEL_MIN_USERS = 32     # below this, a process pool costs more than it saves
+
+
+# =================================================================================================
+# LOADING
+# =================================================================================================
+def _user_columns(username):
+    """One user's tasks as columns (runs in worker processes, so it only returns plain lists)."""
+    columns = {name: [] for name in COLUMNS}
+    for task in plan_store.read_plan(username):
+        columns["username"].append(username)
+        columns["task_id"].append(task.get("id"))
+        columns["date"].append(task.get("date"))
+        columns["priority"].append(task.get("priority") or "None")
+        columns["done"].append(bool(task.get("done", False)))
+    return columns
+
+
+def _to_frame(columns):
+    import pandas as pd
+    df = pd.DataFrame(columns, columns=COLUMNS)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["done"] = df["done"].astype(bool)
+    for name in ("username", "priority"):
+        df[name] = df[name].astype("category")
+    return df
+
+
+def _read_users(usernames, workers):
+    if len(usernames) >= PARALLEL_MIN_USERS and workers != 1:
+        # Spawned, not forked: a fork inside the threaded Streamlit server can copy a lock another
+        # thread holds (plan_store's, storage's) into the child, which then waits on it forever
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(_user_columns, usernames, chunksize=16))
+    return [_user_columns(username) for username in usernames]
+
+
+def _replace_atomically(path, write):
+    """Write path through a temp file of its own, so concurrent refreshes never share one."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def refresh_dataset(workers=None):
+    """Bring the Parquet task table up to date; returns (DataFrame, {"users", "reloaded", "seconds"})."""
+    import pandas as pd
+    start = time.perf_counter()
+    users = plan_store.list_users()
+    signatures = {username: plan_store.plan_signature(username) for username in users}
+    state = storage.read_json(STATE_PATH, {})
+    changed = [username for username in users if state.get(username) != signatures[username]]
+
+    cached = pd.read_parquet(DATASET_PATH) if os.path.exists(DATASET_PATH) and state else None
+    if cached is not None and not changed and len(state) == len(users):
+        return cached, {"users": len(users), "reloaded": 0, "seconds": time.perf_counter() - start}
+
+    frames = [_to_frame(columns) for columns in _read_users(changed, workers)]
+    if cached is not None:
+        # Keep rows of users whose files didn't change (and drop users that are gone)
+        unchanged = set(users) - set(changed)
+        frames.insert(0, cached[cached["username"].isin(unchanged)])
+    df = pd.concat(frames, ignore_index=True) if frames else _to_frame({name: [] for name in COLUMNS})
+    for name in ("username", "priority"):
+        df[name] = df[name].astype(str).astype("category")
+
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    _replace_atomically(DATASET_PATH, lambda f: df.to_parquet(f, index=False))
+    _replace_atomically(STATE_PATH, lambda f: f.write(json.dumps(signatures, indent=4).encode()))
+    storage.invalidate(STATE_PATH)
+    seconds = time.perf_counter() - start
+    logger.info("Analytics dataset refreshed: %d of %d users reloaded in %.2fs.", len(changed), len(users), seconds)
+    return df, {"users": len(users), "reloaded": len(changed), "seconds": seconds}
+
+
+# =================================================================================================
+# METRICS
+# =================================================================================================
+def cohort_completion(df):
+    """Completion rate (%) by signup cohort (month of a user's first task) and months since then."""
+    dated = df.dropna(subset=["date"])
+    if dated.empty:
+        return dated
+    month_index = dated["date"].dt.year * 12 + dated["date"].dt.month
+    first_month = month_index.groupby(dated["username"], observed=True).transform("min")
+    cohorts = dated.assign(
+        cohort=dated.groupby("username", observed=True)["date"].transform("min").dt.strftime("%Y-%m"),
+        months_since=month_index - first_month,
+    )
+    return cohorts.pivot_table(index="cohort", columns="months_since", values="done", aggfunc="mean") * 100
+
+
+def priority_mix(df):
+    """Tasks, share of all tasks (%) and completion rate (%) per priority."""
+    mix = df.groupby("priority", observed=True)["done"].agg(tasks="size", done="sum")
+    mix["share"] = mix["tasks"] / mix["tasks"].sum() * 100
+    mix["completion_rate"] = mix["done"] / mix["tasks"] * 100
+    return mix.sort_values("tasks", ascending=False)
+
+
+def weekly_activity(df):
+    """Tasks, completed tasks, active users and completion rate (%) per week (starting Monday)."""
+    dated = df.dropna(subset=["date"])
+    week = dated["date"].dt.to_period("W-SUN").dt.start_time.rename("week")
+    weekly = dated.groupby(week).agg(tasks=("done", "size"), done=("done", "sum"),
+                                     active_users=("username", "nunique"))
+    weekly["completion_rate"] = weekly["done"] / weekly["tasks"] * 100
+    return weekly
+
+
+# =================================================================================================
+# COMMAND LINE
+# =================================================================================================
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Refresh the cross-user plan dataset and print its metrics.")
+    parser.add_argument("--workers", type=int, default=None, help="processes for reloading changed users")
+    parser.add_argument("--out", help="also write each metric as CSV into this directory")
+    args = parser.parse_args()
+
+    df, info = refresh_dataset(args.workers)
+    print(f"{len(df)} tasks from {info['users']} users "
+          f"({info['reloaded']} reloaded in {info['seconds']:.2f}s) -> {DATASET_PATH}")
+    metrics = {
+        "cohort_completion": cohort_completion(df),
+        "priority_mix": priority_mix(df),
+        "weekly_activity": weekly_activity(df),
+    }
+    for name, table in metrics.items():
+        print(f"\n== {name} ==\n{table.round(1).to_string()}")
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            table.to_csv(os.path.join(args.out, f"{name}.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Process-wide answer cache for context-free assistant questions.
+
+Only the first message of a chat is eligible, since later answers depend on
+the conversation. A question is normalised by dropping case, punctuation,
+possessives, "please" and a leading phrasing such as "what is" or "explain",
+and a cached answer is only reused when the rest matches word for word, in
+order. Rewordings such as "Explain Dijkstra's algorithm" vs "what is
+dijkstra algorithm?" match, while questions that differ by a word ("not",
+"supervised" vs "unsupervised") or by word order ("binary to decimal" vs
+"decimal to binary") never do, since the cache is shared by all users.
+Entries expire after TTL_S and the least recently used are dropped beyond
+MAX_ENTRIES.
+"""
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+TTL_S = 7 * 24 * 60 * 60
+MAX_ENTRIES = 2000
+
+_lock = threading.Lock()
+_entries = OrderedDict()    # normalised question -> (answer, stored at)
+_stats = Counter()
+
+# Openings that change how a question is phrased but not what is being asked
+LEADING_PHRASES = (
+    "can you explain", "could you explain", "can you tell me about", "tell me about",
+    "what is", "what are", "explain", "define", "describe", "a", "an", "the",
+)
+
+
+def normalize(question):
+    """Lower-case, drop punctuation, possessives, "please" and a leading phrasing; keeps word order."""
+    text = question.lower().replace("’", "'").replace("what's", "what is")
+    text = re.sub(r"[^\w\s]", " ", re.sub(r"'s\b", "", text).replace("'", ""))
+    words = [word for word in text.split() if word != "please"]
+    stripped = True
+    while stripped:
+        stripped = False
+        for phrase in LEADING_PHRASES:
+            phrase_words = phrase.split()
+            if words[:len(phrase_words)] == phrase_words and len(words) > len(phrase_words):
+                words = words[len(phrase_words):]
+                stripped = True
+                break
+    return " ".join(words)
+
+
+def _expire(now):
+    # Oldest-used entries sit at the front; expired ones are removed as they are met
+    while _entries:
+        key, (_, stored_at) = next(iter(_entries.items()))
+        if now - stored_at < TTL_S and len(_entries) <= MAX_ENTRIES:
+            break
+        del _entries[key]
+        _stats["evictions"] += 1
+
+
+def lookup(question):
+    """Return the cached answer for a question with the same content words, else None."""
+    key = normalize(question)
+    if not key:
+        return None
+    now = time.time()
+    with _lock:
+        _expire(now)
+        entry = _entries.get(key)
+        if entry and now - entry[1] >= TTL_S:
+            del _entries[key]
+            _stats["evictions"] += 1
+            entry = None
+        if entry:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0]
+        _stats["misses"] += 1
+        return None
+
+
+def store(question, answer):
+    """Remember the answer to a context-free question."""
+    key = normalize(question)
+    if not key or not answer:
+        return
+    with _lock:
+        _entries.pop(key, None)
+        _entries[key] = (answer, time.time())
+        _expire(time.time())
+
+
+def stats():
+    """Return hit/miss counters, the hit rate and the current size."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _stats.clear()
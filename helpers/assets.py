@@ -0,0 +1,177 @@
+"""Background image pipeline.
+
+Images are transcoded to WebP (and downscaled) once, written to ./static
+under a content-hashed name and referenced by URL, so the browser caches
+them instead of receiving a base64 copy in the HTML of every rerun.
+
+Transcoding is kept off the request path: `python -m helpers.assets` builds
+APP_IMAGES ahead of time (and prints the bytes saved per rerun), and
+preload() builds anything still missing on a background thread. Each asset
+has its own lock, so a page only ever waits for the image it needs.
+
+Command line:
+    python -m helpers.assets
+"""
+import base64
+import hashlib
+import io
+import logging
+import mimetypes
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = APP_DIR / "static" / "assets"
+STATIC_URL = "app/static/assets"   # requires server.enableStaticServing
+
+DEFAULT_MAX_WIDTH = 1920
+WEBP_QUALITY = 80
+
+# Every image the pages show, as preload() specs (Home shows the agent image at 300px wide)
+APP_IMAGES = ("bg.gif", ("AiAgent.png", 600), "M.jpg", "night.jpg", "lock.jpg")
+
+_lock = threading.Lock()    # guards _assets, _asset_locks and _preloading only
+_assets = {}
+_asset_locks = {}
+_preloading = set()
+
+
+# =================================================================================================
+# TRANSCODING
+# =================================================================================================
+def _transcode(data, max_width):
+    """Return the image bytes re-encoded as (possibly animated) WebP, no wider than max_width."""
+    from PIL import Image, ImageSequence
+
+    img = Image.open(io.BytesIO(data))
+    scale = min(1.0, max_width / img.width)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    buf = io.BytesIO()
+
+    if getattr(img, "is_animated", False):
+        frames, durations = [], []
+        for frame in ImageSequence.Iterator(img):
+            frames.append(frame.convert("RGBA").resize(size, Image.LANCZOS))
+            durations.append(frame.info.get("duration", 100))
+        frames[0].save(buf, "WEBP", save_all=True, append_images=frames[1:],
+                       duration=durations, loop=0, quality=WEBP_QUALITY)
+    else:
+        mode = "RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB"
+        img.convert(mode).resize(size, Image.LANCZOS).save(buf, "WEBP", quality=WEBP_QUALITY, method=6)
+    return buf.getvalue()
+
+
+def _data_uri(data, mime):
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def _build(source, max_width):
+    """Transcode one source image and return its asset record."""
+    data = source.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    target = STATIC_DIR / f"{source.stem}-{digest}-w{max_width}.webp"
+
+    if target.exists():
+        encoded_size = target.stat().st_size
+        url = f"{STATIC_URL}/{target.name}"
+    else:
+        try:
+            encoded = _transcode(data, max_width)
+        except Exception as e:
+            # Pillow missing or unreadable image: fall back to inlining the original
+            logger.warning("Could not transcode %s (%s); inlining it instead.", source.name, e)
+            mime = mimetypes.guess_type(source.name)[0] or "image/jpeg"
+            return {"url": _data_uri(data, mime), "source_bytes": len(data),
+                    "encoded_bytes": len(data), "saved_per_rerun": 0}
+        try:
+            STATIC_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(".tmp")
+            tmp.write_bytes(encoded)
+            tmp.replace(target)
+            url = f"{STATIC_URL}/{target.name}"
+        except OSError as e:
+            logger.warning("Could not write %s (%s); inlining the WebP instead.", target, e)
+            url = _data_uri(encoded, "image/webp")
+        encoded_size = len(encoded)
+
+    # What the old code sent on every rerun minus what we send now
+    inline_size = 4 * ((len(data) + 2) // 3)
+    saved = max(0, inline_size - len(url))
+    logger.info("%s: %d -> %d bytes, saves %d bytes per rerun", source.name, len(data), encoded_size, saved)
+    return {"url": url, "source_bytes": len(data), "encoded_bytes": encoded_size, "saved_per_rerun": saved}
+
+
+# =================================================================================================
+# PUBLIC API
+# =================================================================================================
+def get_asset(file_name, max_width=DEFAULT_MAX_WIDTH):
+    """Return the asset record for an image in the app directory, building it on first use."""
+    source = APP_DIR / file_name
+    key = (source, max_width)
+    with _lock:
+        if key in _assets:
+            return _assets[key]
+        asset_lock = _asset_locks.setdefault(key, threading.Lock())
+    # Only callers wanting this same image wait while it is built
+    with asset_lock:
+        with _lock:
+            if key in _assets:
+                return _assets[key]
+        if not source.exists():
+            logger.warning("Asset not found: %s", source)
+            return None
+        asset = _build(source, max_width)
+        with _lock:
+            _assets[key] = asset
+        return asset
+
+
+def asset_url(file_name, max_width=DEFAULT_MAX_WIDTH):
+    """Return a URL usable in CSS/HTML for the image, or "" if it is missing."""
+    asset = get_asset(file_name, max_width)
+    return asset["url"] if asset else ""
+
+
+def _parse_spec(spec):
+    return spec if isinstance(spec, tuple) else (spec, DEFAULT_MAX_WIDTH)
+
+
+def build_all(*specs):
+    """Build several assets now; each spec is a file name or a (file name, max width) pair."""
+    for spec in specs:
+        get_asset(*_parse_spec(spec))
+
+
+def preload(*specs):
+    """Build several assets on a background thread (once per process) and return immediately."""
+    with _lock:
+        pending = [spec for spec in specs if _parse_spec(spec) not in _preloading]
+        _preloading.update(_parse_spec(spec) for spec in pending)
+    if pending:
+        threading.Thread(target=build_all, args=pending, name="asset-preload", daemon=True).start()
+
+
+def savings_report():
+    """Return {file name: bytes saved per rerun} for every asset built so far."""
+    with _lock:
+        return {source.name: asset["saved_per_rerun"] for (source, _), asset in _assets.items()}
+
+
+# =================================================================================================
+# COMMAND LINE
+# =================================================================================================
+def main():
+    """Build APP_IMAGES into ./static ahead of deployment and report what they save."""
+    build_all(*APP_IMAGES)
+    with _lock:
+        assets = {source.name: asset for (source, _), asset in _assets.items()}
+    for name, asset in assets.items():
+        print(f"{name:12} {asset['source_bytes'] / 1e3:9.1f} kB -> {asset['encoded_bytes'] / 1e3:8.1f} kB, "
+              f"saves {asset['saved_per_rerun'] / 1e3:9.1f} kB per rerun")
+    print(f"Total saved per rerun: {sum(savings_report().values()) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
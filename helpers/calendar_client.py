@@ -0,0 +1,80 @@
+"""Process-wide Google Calendar client.
+
+The service object is built once per process from the service-account
+credentials in st.secrets, using the discovery document bundled with
+googleapiclient (static_discovery=True), so no page rerun parses
+credentials or discovery JSON again. httplib2 connections are not thread
+safe, so every thread (Streamlit sessions, the calendar_sync worker) sends
+its requests through its own authorised connection. The shared credentials
+are only refreshed, under a lock, once they have expired.
+"""
+import logging
+import threading
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_local = threading.local()
+_service = None
+_credentials = None
+
+
+def configured():
+    """Whether Calendar credentials exist, without building anything."""
+    try:
+        return "google_credentials" in st.secrets
+    except Exception:
+        return False
+
+
+def _ensure_fresh():
+    if _credentials.valid:
+        return
+    with _refresh_lock:
+        if not _credentials.valid:
+            import google_auth_httplib2
+            import httplib2
+            _credentials.refresh(google_auth_httplib2.Request(httplib2.Http()))
+            logger.info("Refreshed Google Calendar credentials.")
+
+
+def _thread_http():
+    http = getattr(_local, "http", None)
+    if http is None:
+        import google_auth_httplib2
+        import httplib2
+        http = _local.http = google_auth_httplib2.AuthorizedHttp(_credentials, http=httplib2.Http())
+    return http
+
+
+def _build_request(http, *args, **kwargs):
+    """requestBuilder for build(): bind each request to the calling thread's connection."""
+    from googleapiclient.http import HttpRequest
+    _ensure_fresh()
+    return HttpRequest(_thread_http(), *args, **kwargs)
+
+
+def get_calendar_service():
+    """Return the shared Calendar service, building it on first use; None if it can't be built."""
+    global _service, _credentials
+    if _service is not None:
+        return _service
+    with _lock:
+        if _service is None:
+            try:
+                from google.oauth2 import service_account
+                from googleapiclient.discovery import build
+                _credentials = service_account.Credentials.from_service_account_info(
+                    dict(st.secrets["google_credentials"]), scopes=SCOPES
+                )
+                _service = build('calendar', 'v3', credentials=_credentials, requestBuilder=_build_request,
+                                 static_discovery=True, cache_discovery=False)
+            except Exception as e:
+                logger.warning("Could not build the Google Calendar client: %s", e)
+                return None
+    return _service
@@ -0,0 +1,453 @@
+"""Background Google Calendar sync through a persisted outbox.
+
+The planner no longer calls the Calendar API from the Streamlit script.
+Operations are written to an SQLite outbox (calendar_outbox.db) and a
+daemon thread drains it with Calendar batch requests, retrying failures
+with exponential backoff. Every event gets a deterministic id derived from
+its task id, so retrying an insert that already went through is harmless
+(the API answers 409 and the operation is treated as done).
+
+Existing plans are backfilled by reconciliation: a local mirror of the
+study events on the calendar (kept current incrementally with a Calendar
+sync token) is diffed against each user's plan and the differences are
+queued as inserts, updates and deletes. Every event body carries a hash of
+its managed fields in a private extended property, so changes such as a
+task being ticked off are detected without comparing API-normalised
+fields. The worker reconciles all users every RECONCILE_INTERVAL_S;
+operations that failed for good are dropped then and re-queued if the diff
+still needs them.
+
+Events the planner created before the outbox existed have random ids and
+no extended properties. Reconciliation matches them to tasks by summary,
+start and end, and replaces each with the task's deterministic event, so a
+backfill doesn't add a second copy of every task.
+
+The worker only needs an object shaped like the googleapiclient Calendar
+service (events().insert/patch/delete/list and new_batch_http_request), so
+it can be driven synchronously with drain_once() and reconcile_user()
+against a local fake.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from helpers import plan_store
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+OUTBOX_DB = APP_DIR / "calendar_outbox.db"
+CALENDAR_ID = "primary"
+TIME_ZONE = "Asia/Kolkata"
+
+BATCH_SIZE = 50             # Calendar API limit for one batch request
+MAX_ATTEMPTS = 8
+BASE_BACKOFF_S = 2
+MAX_BACKOFF_S = 15 * 60
+POLL_INTERVAL_S = 5
+RECONCILE_INTERVAL_S = 15 * 60
+
+# Summary of the events the planner inserted directly before the outbox existed
+LEGACY_SUMMARY = re.compile(r"^\[[^\]]*\] Study: ")
+
+_init_lock = threading.Lock()
+_initialized = False
+_worker = None
+_worker_lock = threading.Lock()
+_service_factory = None
+_wake = threading.Event()
+
+
+# =================================================================================================
+# EVENT BODIES
+# =================================================================================================
+def event_id_for(task):
+    """Deterministic Calendar event id for a task (task ids are hex, a valid base32hex subset)."""
+    return task["id"]
+
+
+def task_to_event(username, task):
+    """Build the Calendar event body for a plan task, including its done state."""
+    done = task.get("done", False)
+    body = {
+        "summary": f"{'✅ ' if done else ''}[{task['priority']}] Study: {task['subject']}",
+        "colorId": "10" if done else "11",
+        "start": {"dateTime": f"{task['date']}T{task['start']}", "timeZone": TIME_ZONE},
+        "end": {"dateTime": f"{task['date']}T{task['end']}", "timeZone": TIME_ZONE},
+        "reminders": {"useDefault": False, "overrides": [{"method": "popup", "minutes": 10}]},
+    }
+    body_hash = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+    body["id"] = event_id_for(task)
+    body["extendedProperties"] = {"private": {
+        "studyBuddyUser": username, "studyBuddyTask": task["id"], "studyBuddyHash": body_hash,
+    }}
+    return body
+
+
+def _body_hash(body):
+    return body.get("extendedProperties", {}).get("private", {}).get("studyBuddyHash")
+
+
+def _legacy_key(summary, start, end):
+    # Minutes precision: the API returns "2026-01-05T09:00:00+05:30" for a "2026-01-05T09:00:00" start
+    return f"{summary}|{start[:16]}|{end[:16]}"
+
+
+def _legacy_key_for(task):
+    """The key an event created for this task before the outbox existed would have."""
+    return _legacy_key(f"[{task['priority']}] Study: {task['subject']}",
+                       f"{task['date']}T{task['start']}", f"{task['date']}T{task['end']}")
+
+
+# =================================================================================================
+# OUTBOX STORAGE
+# =================================================================================================
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(OUTBOX_DB, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS outbox (
+                                op_id TEXT PRIMARY KEY,
+                                username TEXT NOT NULL,
+                                kind TEXT NOT NULL,
+                                event_id TEXT NOT NULL,
+                                body TEXT,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                revision INTEGER NOT NULL DEFAULT 0,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                next_attempt_at REAL NOT NULL,
+                                last_error TEXT,
+                                created_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            # What we believe is on the calendar: study events by id, with their body hash
+            conn.execute("""CREATE TABLE IF NOT EXISTS remote_events (
+                                event_id TEXT PRIMARY KEY,
+                                username TEXT NOT NULL,
+                                body_hash TEXT)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS remote_events_user ON remote_events (username)")
+            # Study events created before the outbox (random ids, no extended properties)
+            conn.execute("""CREATE TABLE IF NOT EXISTS legacy_events (
+                                event_id TEXT PRIMARY KEY,
+                                match_key TEXT NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS legacy_events_key ON legacy_events (match_key)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (calendar_id TEXT PRIMARY KEY, sync_token TEXT)")
+        _initialized = True
+
+
+def enqueue(username, kind, event_id, body=None):
+    """Queue an insert/update/delete. Re-queueing the same kind for an event replaces it."""
+    _init_db()
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            """INSERT INTO outbox (op_id, username, kind, event_id, body, next_attempt_at, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(op_id) DO UPDATE SET body = excluded.body, status = 'pending',
+                   revision = revision + 1, attempts = 0,
+                   next_attempt_at = excluded.next_attempt_at, last_error = NULL""",
+            (f"{kind}:{event_id}", username, kind, event_id, json.dumps(body) if body else None, now, now),
+        )
+    _wake.set()
+
+
+def enqueue_task(username, task):
+    """Queue the Calendar insert for a newly added task."""
+    enqueue(username, "insert", event_id_for(task), task_to_event(username, task))
+
+
+def enqueue_task_update(username, task):
+    """Queue a Calendar update after a task changed (e.g. was ticked off)."""
+    body = task_to_event(username, task)
+    del body["id"]
+    enqueue(username, "update", event_id_for(task), body)
+
+
+def outbox_status(username):
+    """Return {"pending": n, "failed": n} for a user's queued operations."""
+    _init_db()
+    with _connect() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM outbox WHERE username = ? GROUP BY status",
+                            (username,)).fetchall()
+    counts = {"pending": 0, "failed": 0}
+    counts.update({row["status"]: row["n"] for row in rows})
+    return counts
+
+
+def _due_ops(now):
+    with _connect() as conn:
+        rows = conn.execute(
+            """SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?
+               ORDER BY created_at LIMIT ?""", (now, BATCH_SIZE * 2)).fetchall()
+    # One operation per event per batch: batch members run in no guaranteed order
+    batch, seen = [], set()
+    for row in rows:
+        if row["event_id"] not in seen:
+            seen.add(row["event_id"])
+            batch.append(dict(row))
+    return batch[:BATCH_SIZE]
+
+
+def _complete(op):
+    # The revision check keeps an operation re-queued while this one was in flight
+    with _connect() as conn:
+        conn.execute("DELETE FROM outbox WHERE op_id = ? AND revision = ?", (op["op_id"], op["revision"]))
+
+
+def _retry_later(op, error, permanent=False):
+    attempts = op["attempts"] + 1
+    delay = min(MAX_BACKOFF_S, BASE_BACKOFF_S * 2 ** attempts) * random.uniform(0.5, 1.0)
+    status = "failed" if permanent or attempts >= MAX_ATTEMPTS else "pending"
+    with _connect() as conn:
+        conn.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, status = ? "
+                     "WHERE op_id = ? AND revision = ?",
+                     (attempts, time.time() + delay, str(error)[:500], status, op["op_id"], op["revision"]))
+    if status == "failed":
+        logger.warning("Calendar %s for %s gave up after %d attempts: %s", op["kind"], op["event_id"], attempts, error)
+
+
+# =================================================================================================
+# DRAINING
+# =================================================================================================
+def _build_request(service, op):
+    events = service.events()
+    if op["kind"] == "insert":
+        return events.insert(calendarId=CALENDAR_ID, body=json.loads(op["body"]))
+    if op["kind"] == "update":
+        return events.patch(calendarId=CALENDAR_ID, eventId=op["event_id"], body=json.loads(op["body"]))
+    return events.delete(calendarId=CALENDAR_ID, eventId=op["event_id"])
+
+
+def _status_of(exception):
+    resp = getattr(exception, "resp", None)
+    return getattr(resp, "status", None)
+
+
+def _mirror_applied(op):
+    """Record a successful operation in the remote mirror without waiting for the next pull."""
+    with _connect() as conn:
+        if op["kind"] == "delete":
+            conn.execute("DELETE FROM remote_events WHERE event_id = ?", (op["event_id"],))
+            conn.execute("DELETE FROM legacy_events WHERE event_id = ?", (op["event_id"],))
+        else:
+            conn.execute("INSERT OR REPLACE INTO remote_events (event_id, username, body_hash) VALUES (?, ?, ?)",
+                         (op["event_id"], op["username"], _body_hash(json.loads(op["body"]))))
+
+
+def _handle_result(op, exception):
+    if exception is None:
+        _mirror_applied(op)
+        _complete(op)
+        return
+    status = _status_of(exception)
+    if (op["kind"] == "insert" and status == 409) or (op["kind"] == "delete" and status in (404, 410)):
+        # Already applied by an earlier attempt whose response was lost
+        _mirror_applied(op)
+        _complete(op)
+    elif op["kind"] == "update" and status == 404:
+        # The event never made it to the calendar; recreate it with the new body
+        _complete(op)
+        body = json.loads(op["body"])
+        body["id"] = op["event_id"]
+        enqueue(op["username"], "insert", op["event_id"], body)
+    else:
+        _retry_later(op, exception, permanent=status in (400, 401))
+
+
+def drain_once(service):
+    """Send one batch of due operations. Returns the number of operations attempted."""
+    _init_db()
+    ops = _due_ops(time.time())
+    if not ops:
+        return 0
+    by_id = {op["op_id"]: op for op in ops}
+
+    def callback(request_id, response, exception):
+        _handle_result(by_id[request_id], exception)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for op in ops:
+        batch.add(_build_request(service, op), request_id=op["op_id"])
+    try:
+        batch.execute()
+    except Exception as e:
+        # The whole batch failed (network down, auth error): back off every member
+        for op in ops:
+            _retry_later(op, e)
+    return len(ops)
+
+
+# =================================================================================================
+# RECONCILIATION
+# =================================================================================================
+def _list_pages(service, **params):
+    request = service.events().list(calendarId=CALENDAR_ID, maxResults=2500, **params)
+    while request is not None:
+        response = request.execute()
+        yield response
+        request = service.events().list_next(request, response)
+
+
+def pull_changes(service):
+    """Bring the remote mirror up to date, incrementally when a sync token is stored."""
+    _init_db()
+    with _connect() as conn:
+        row = conn.execute("SELECT sync_token FROM sync_state WHERE calendar_id = ?", (CALENDAR_ID,)).fetchone()
+    token = row["sync_token"] if row else None
+    try:
+        params = {"syncToken": token} if token else {"showDeleted": False, "singleEvents": False}
+        pages = list(_list_pages(service, **params))
+    except Exception as e:
+        if token and _status_of(e) == 410:
+            # Token expired: forget it and the mirror, then do one full listing
+            with _connect() as conn:
+                conn.execute("DELETE FROM sync_state WHERE calendar_id = ?", (CALENDAR_ID,))
+                conn.execute("DELETE FROM remote_events")
+                conn.execute("DELETE FROM legacy_events")
+            return pull_changes(service)
+        raise
+
+    with _connect() as conn:
+        if not token:
+            conn.execute("DELETE FROM remote_events")
+            conn.execute("DELETE FROM legacy_events")
+        for page in pages:
+            for event in page.get("items", []):
+                private = event.get("extendedProperties", {}).get("private", {})
+                if event.get("status") == "cancelled":
+                    conn.execute("DELETE FROM remote_events WHERE event_id = ?", (event["id"],))
+                    conn.execute("DELETE FROM legacy_events WHERE event_id = ?", (event["id"],))
+                elif "studyBuddyUser" in private:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO remote_events (event_id, username, body_hash) VALUES (?, ?, ?)",
+                        (event["id"], private["studyBuddyUser"], private.get("studyBuddyHash")),
+                    )
+                elif LEGACY_SUMMARY.match(event.get("summary", "")) and "dateTime" in event.get("start", {}):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO legacy_events (event_id, match_key) VALUES (?, ?)",
+                        (event["id"], _legacy_key(event["summary"], event["start"]["dateTime"],
+                                                  event.get("end", {}).get("dateTime", ""))),
+                    )
+        next_token = pages[-1].get("nextSyncToken") if pages else None
+        if next_token:
+            conn.execute("INSERT OR REPLACE INTO sync_state (calendar_id, sync_token) VALUES (?, ?)",
+                         (CALENDAR_ID, next_token))
+
+
+def reconcile_user(service, username, plan=None, pull=True):
+    """Queue whatever inserts/updates/deletes make the calendar match the user's plan.
+
+    Returns {"insert": n, "update": n, "delete": n, "skipped": n}; the outbox
+    worker sends them. Tasks that can't become an event (e.g. no times) are
+    skipped and logged.
+    """
+    if pull:
+        pull_changes(service)
+    if plan is None:
+        plan = plan_store.load_plan(username)
+    with _connect() as conn:
+        # Operations that gave up are dropped; the diff below queues them again if still needed
+        conn.execute("DELETE FROM outbox WHERE username = ? AND status = 'failed'", (username,))
+        remote = {row["event_id"]: row["body_hash"] for row in
+                  conn.execute("SELECT event_id, body_hash FROM remote_events WHERE username = ?", (username,))}
+        # Events with an operation already queued are left to it (and keep its backoff state)
+        queued = {row["event_id"] for row in
+                  conn.execute("SELECT event_id FROM outbox WHERE username = ?", (username,))}
+        legacy = {}
+        for row in conn.execute("SELECT event_id, match_key FROM legacy_events "
+                                "WHERE event_id NOT IN (SELECT event_id FROM outbox)"):
+            legacy.setdefault(row["match_key"], []).append(row["event_id"])
+    counts = {"insert": 0, "update": 0, "delete": 0, "skipped": 0}
+    for task in plan:
+        try:
+            body = task_to_event(username, task)
+            legacy_key = _legacy_key_for(task)
+        except (KeyError, TypeError) as e:
+            logger.warning("Skipping calendar sync of task %s for %s: missing %s", task.get("id"), username, e)
+            counts["skipped"] += 1
+            continue
+        event_id = body["id"]
+        if event_id in queued:
+            continue
+        if event_id not in remote:
+            if legacy.get(legacy_key):
+                # Replace the event the planner created before the outbox with the tracked one
+                enqueue(username, "delete", legacy[legacy_key].pop())
+                counts["delete"] += 1
+            enqueue(username, "insert", event_id, body)
+            counts["insert"] += 1
+        elif remote[event_id] != _body_hash(body):
+            del body["id"]
+            enqueue(username, "update", event_id, body)
+            counts["update"] += 1
+    for event_id in remote.keys() - queued - {event_id_for(task) for task in plan if "id" in task}:
+        enqueue(username, "delete", event_id)
+        counts["delete"] += 1
+    return counts
+
+
+def reconcile_all(service):
+    """Reconcile every user with a plan; the calendar is listed once for all of them.
+
+    A user whose reconcile fails is logged and skipped, so the others still sync.
+    """
+    pull_changes(service)
+    totals = {"insert": 0, "update": 0, "delete": 0, "skipped": 0}
+    for username in plan_store.list_users():
+        try:
+            counts = reconcile_user(service, username, pull=False)
+        except Exception as e:
+            logger.warning("Calendar reconcile failed for %s: %s", username, e)
+            continue
+        for kind, n in counts.items():
+            totals[kind] += n
+    logger.info("Calendar reconcile queued %s", totals)
+    return totals
+
+
+def _run_worker():
+    last_reconcile = None
+    while True:
+        _wake.clear()
+        try:
+            service = _service_factory() if _service_factory else None
+            if service and (last_reconcile is None or time.monotonic() - last_reconcile > RECONCILE_INTERVAL_S):
+                last_reconcile = time.monotonic()
+                reconcile_all(service)
+            sent = drain_once(service) if service else 0
+        except Exception as e:
+            logger.warning("Calendar outbox worker error: %s", e)
+            sent = 0
+        if not sent:
+            _wake.wait(POLL_INTERVAL_S)
+
+
+def start_worker(service_factory):
+    """Start the process-wide outbox worker (once); service_factory returns a Calendar service or None."""
+    global _worker, _service_factory
+    with _worker_lock:
+        _service_factory = service_factory
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="calendar-outbox", daemon=True)
+            _worker.start()
+    _wake.set()
@@ -0,0 +1,87 @@
+"""Process-wide cache of live Gemini chat sessions.
+
+Building a ChatSession from the full saved history on every message means
+re-serialising the whole conversation each turn. Sessions are instead kept
+per (username, chat file, persona) and reused, so each turn only sends the
+new message; the session appends the exchange to its own history. Entries are
+evicted least-recently-used beyond MAX_SESSIONS or after IDLE_TIMEOUT_S,
+and a miss rebuilds the session from chats/<username>/<chat file>. Sessions
+are (re)built through context_window, so long chats start from a summary
+plus recent messages, and a session that outgrows the budget is rebuilt.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from helpers import context_window, storage
+
+logger = logging.getLogger(__name__)
+
+CHATS_DIR = "chats"
+MAX_SESSIONS = 256
+IDLE_TIMEOUT_S = 30 * 60
+
+_sessions = OrderedDict()   # (username, filename, persona) -> (session, saved messages not in it, last used)
+_lock = threading.Lock()
+
+
+def _load_messages(username, filename):
+    return storage.read_json(os.path.join(CHATS_DIR, username, filename), [], copy=False)
+
+
+def _session_turns(session):
+    try:
+        return len(session.history)
+    except Exception:
+        # The last streamed reply was never fully consumed; the session is unusable
+        return -1
+
+
+def _evict_idle(now):
+    while _sessions:
+        key, (_, _, last_used) = next(iter(_sessions.items()))
+        if now - last_used < IDLE_TIMEOUT_S and len(_sessions) <= MAX_SESSIONS:
+            break
+        del _sessions[key]
+
+
+def get_session(model, username, filename, turns, persona="assistant"):
+    """Return a live ChatSession for this conversation.
+
+    `turns` is the number of messages already saved for the chat; a cached
+    session whose history has drifted from it (e.g. a failed reply, or the
+    same chat open in another tab) is rebuilt. `persona` is the llm persona
+    `model` was made for; sessions of different personas are never shared,
+    since each carries its model's system instruction.
+    """
+    key = (username, filename, persona)
+    now = time.monotonic()
+    with _lock:
+        _evict_idle(now)
+        cached = _sessions.get(key)
+        if cached:
+            session, dropped, _ = cached
+            if (_session_turns(session) == turns - dropped
+                    and not context_window.over_budget(session.history)):
+                _sessions[key] = (session, dropped, now)
+                _sessions.move_to_end(key)
+                return session
+
+    messages = _load_messages(username, filename)
+    history = context_window.build_history(username, filename, messages)
+    session = model.start_chat(history=history)
+    with _lock:
+        _sessions[key] = (session, len(messages) - len(history), now)
+        _sessions.move_to_end(key)
+        _evict_idle(now)
+    logger.debug("Rehydrated chat session %s with %d history entries", key, len(history))
+    return session
+
+
+def evict(username, filename):
+    """Drop the cached sessions for a chat, whatever their persona (e.g. after it is deleted)."""
+    with _lock:
+        for key in [key for key in _sessions if key[:2] == (username, filename)]:
+            del _sessions[key]
@@ -0,0 +1,51 @@
+"""Streaming Gemini replies for the chat pages."""
+import logging
+import time
+
+import streamlit as st
+
+from helpers import context_window, llm
+
+logger = logging.getLogger(__name__)
+
+MAX_RECORDED_REPLIES = 50
+
+
+def _record_metrics(metrics):
+    """Keep the most recent reply metrics in the session for inspection."""
+    history = st.session_state.setdefault("reply_metrics", [])
+    history.append(metrics)
+    del history[:-MAX_RECORDED_REPLIES]
+    logger.info("Reply streamed: ~%d prompt tokens, first token %.2fs, total %.2fs",
+                metrics["prompt_tokens"], metrics["first_token_s"] or -1, metrics["total_s"])
+
+
+def stream_reply(chat, prompt):
+    """Send a prompt on a ChatSession and render the answer as it streams in.
+
+    Must be called inside the st.chat_message container the reply belongs
+    to. Returns (full reply text, metrics) once the stream has finished, so
+    callers can persist the conversation exactly once. Metrics hold the
+    estimated prompt size and the time to first token and in total.
+    """
+    metrics = {
+        "prompt_tokens": context_window.history_tokens(chat.history) + context_window.estimate_tokens(prompt),
+        "first_token_s": None,
+    }
+    start = time.perf_counter()
+
+    def chunks():
+        for chunk in chat.send_message(prompt, stream=True, request_options=llm.REQUEST_OPTIONS):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. only safety metadata)
+                continue
+            if metrics["first_token_s"] is None:
+                metrics["first_token_s"] = time.perf_counter() - start
+            yield text
+
+    reply = st.write_stream(chunks())
+    metrics["total_s"] = time.perf_counter() - start
+    _record_metrics(metrics)
+    return reply if isinstance(reply, str) else "".join(map(str, reply)), metrics
@@ -0,0 +1,139 @@
+"""Context-window budgeting for long chats.
+
+The most recent messages are sent to Gemini verbatim, as many as fit the
+token budget (at most KEEP_MESSAGES); everything older is folded into a
+running summary cached in chats/<username>/summaries/<chat file>. The
+summary is only regenerated once more than RESUMMARIZE_AFTER messages have
+left the verbatim window since it was made, so most turns reuse it as-is.
+Until then, messages that no longer fit the budget are left out of the
+prompt rather than sent over it.
+"""
+import logging
+import os
+
+from helpers import llm, storage
+
+logger = logging.getLogger(__name__)
+
+CHATS_DIR = "chats"
+KEEP_MESSAGES = 20          # messages always sent verbatim
+RESUMMARIZE_AFTER = 10      # extra messages tolerated before the summary is stale
+MAX_PROMPT_TOKENS = 8000    # rough budget for the history sent with each turn
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PROMPT = (
+    "Summarise the conversation below for your own future reference. Keep names, facts, "
+    "decisions, open questions and anything the user asked you to remember. Be concise.\n\n"
+)
+
+
+# =================================================================================================
+# TOKEN ESTIMATES
+# =================================================================================================
+def _text_of(entry):
+    """Text of a saved message dict or a Gemini Content object."""
+    if isinstance(entry, dict):
+        parts = entry.get("parts", "")
+        return parts if isinstance(parts, str) else " ".join(map(str, parts))
+    return " ".join(getattr(part, "text", "") for part in entry.parts)
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (no API round-trip)."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def history_tokens(history):
+    return sum(estimate_tokens(_text_of(entry)) for entry in history)
+
+
+def over_budget(history):
+    """True when a live session's history should be rebuilt (which reuses the summary while it is fresh)."""
+    if len(history) > KEEP_MESSAGES + RESUMMARIZE_AFTER + 2:
+        return True
+    return history_tokens(history) > MAX_PROMPT_TOKENS
+
+
+# =================================================================================================
+# SUMMARY CACHE
+# =================================================================================================
+def _summary_path(username, filename):
+    return os.path.join(CHATS_DIR, username, "summaries", filename)
+
+
+def _load_summary(username, filename):
+    return storage.read_json(_summary_path(username, filename), {"covered": 0, "summary": ""})
+
+
+def _save_summary(username, filename, record):
+    storage.write_json(_summary_path(username, filename), record)
+
+
+def delete_summary(username, filename):
+    path = _summary_path(username, filename)
+    if os.path.exists(path):
+        os.remove(path)
+    storage.invalidate(path)
+
+
+def _summarize(previous_summary, messages):
+    transcript = "\n".join(f"{m['role']}: {_text_of(m)}" for m in messages)
+    if previous_summary:
+        transcript = f"Earlier summary:\n{previous_summary}\n\nLater messages:\n{transcript}"
+    model = llm.get_model("summarizer")
+    return model.generate_content(SUMMARY_PROMPT + transcript, request_options=llm.REQUEST_OPTIONS).text
+
+
+# =================================================================================================
+# HISTORY BUILDING
+# =================================================================================================
+def _gemini_role(role):
+    return "model" if role == "assistant" else role
+
+
+def _window_start(messages, first, budget):
+    """Index of the newest run of messages[first:] that fits in budget tokens, starting on a user turn."""
+    start, used = len(messages), 0
+    while start > first:
+        used += estimate_tokens(_text_of(messages[start - 1]))
+        if used > budget:
+            break
+        start -= 1
+    # Start on a user turn so roles keep alternating after the summary
+    while start < len(messages) and messages[start]["role"] != "user":
+        start += 1
+    return start
+
+
+def build_history(username, filename, messages):
+    """Return the Gemini history to start a session with for these saved messages.
+
+    Short chats are returned whole. Longer ones become a summary exchange
+    followed by the newest messages that fit the token budget.
+    """
+    as_gemini = [{"role": _gemini_role(m["role"]), "parts": m["parts"]} for m in messages]
+    if len(messages) <= KEEP_MESSAGES + RESUMMARIZE_AFTER and history_tokens(messages) <= MAX_PROMPT_TOKENS:
+        return as_gemini
+
+    record = _load_summary(username, filename)
+    covered = min(record["covered"], len(messages))
+    window = _window_start(messages, max(covered, len(messages) - KEEP_MESSAGES),
+                           MAX_PROMPT_TOKENS - estimate_tokens(record["summary"]))
+    # Staleness is counted in messages, so a chat of long replies doesn't re-summarise every turn
+    if window - covered > RESUMMARIZE_AFTER or not record["summary"]:
+        try:
+            summary = _summarize(record["summary"], messages[covered:window])
+        except Exception as e:
+            logger.warning("Could not summarise %s/%s (%s); sending full history.", username, filename, e)
+            return as_gemini
+        record = {"covered": window, "summary": summary}
+        _save_summary(username, filename, record)
+        covered = window
+        logger.info("Summarised %d messages of %s/%s", window, username, filename)
+
+    # Everything since the summary that fits the budget; older unsummarised messages wait for the next summary
+    verbatim = _window_start(messages, covered, MAX_PROMPT_TOKENS - estimate_tokens(record["summary"]))
+    return [
+        {"role": "user", "parts": f"Summary of our conversation so far:\n{record['summary']}"},
+        {"role": "model", "parts": "Thanks, I'll keep that in mind."},
+    ] + as_gemini[verbatim:]
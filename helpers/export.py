@@ -0,0 +1,255 @@
+"""Columnar bulk export and import of plans, chats and timetables.
+
+The export is a directory of Hive-style partitions, one file per user and
+month, in Parquet or NDJSON:
+
+    <out>/plans/user=<username>/date=<YYYY-MM>/part-0.parquet
+    <out>/chats/user=<username>/date=<YYYY-MM>/part-0.parquet
+    <out>/timetables/user=<username>/date=<YYYY-MM>/part-0.parquet
+
+Plans are dated by task date, chats by the chat file's last change (messages
+carry no timestamps) and timetables by the day they were saved for. Users
+are exported and imported one at a time, so memory is bounded by the
+largest single user, not by how many users there are.
+
+Importing merges plans by task id and replaces chats and timetables that
+appear in the export.
+
+Command line:
+    python -m helpers.export export OUT_DIR [--format parquet|ndjson] [--users NAME ...]
+    python -m helpers.export import IN_DIR
+"""
+import datetime
+import glob
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from urllib.parse import quote, unquote
+
+from helpers import plan_store, storage
+
+logger = logging.getLogger(__name__)
+
+CHATS_DIR = "chats"
+TIMETABLES_DIR = "user_timetables"
+DATASETS = ("plans", "chats", "timetables")
+FORMATS = ("parquet", "ndjson")
+PLAN_FIELDS = ("id", "date", "subject", "priority", "start", "end", "done")
+PARQUET_BATCH_ROWS = 10000
+
+
+def _schemas():
+    import pyarrow as pa
+    return {
+        "plans": pa.schema([("username", pa.string())] + [(name, pa.string()) for name in PLAN_FIELDS[:-1]]
+                           + [("done", pa.bool_()), ("extra", pa.string())]),
+        "chats": pa.schema([("username", pa.string()), ("chat", pa.string()), ("seq", pa.int32()),
+                            ("role", pa.string()), ("text", pa.string()), ("date", pa.string())]),
+        "timetables": pa.schema([("username", pa.string()), ("date", pa.string()), ("slot", pa.string()),
+                                 ("activity", pa.string())]),
+    }
+
+
+# =================================================================================================
+# ROWS PER USER
+# =================================================================================================
+def _plan_rows(username):
+    for task in plan_store.read_plan(username):
+        row = {"username": username, "done": bool(task.get("done", False))}
+        for name in PLAN_FIELDS[:-1]:
+            row[name] = None if task.get(name) is None else str(task[name])
+        extra = {key: value for key, value in task.items() if key not in PLAN_FIELDS}
+        row["extra"] = json.dumps(extra) if extra else None
+        yield row
+
+
+def _chat_files(username):
+    return sorted(glob.glob(os.path.join(CHATS_DIR, username, "*.json")))
+
+
+def _chat_rows(username):
+    for path in _chat_files(username):
+        date_str = datetime.date.fromtimestamp(os.path.getmtime(path)).isoformat()
+        for seq, message in enumerate(storage.read_json(path, [], copy=False)):
+            parts = message.get("parts", "")
+            yield {"username": username, "chat": os.path.basename(path), "seq": seq, "role": message.get("role"),
+                   "text": parts if isinstance(parts, str) else json.dumps(parts), "date": date_str}
+
+
+def _timetable_rows(username):
+    saved = storage.read_json(os.path.join(TIMETABLES_DIR, f"{username}.json"), copy=False)
+    if not saved or "timetable_json" not in saved:
+        return
+    table = json.loads(saved["timetable_json"])     # pandas orient='split'
+    for slot, values in zip(table.get("index", []), table.get("data", [])):
+        yield {"username": username, "date": saved.get("date"), "slot": slot,
+               "activity": values[0] if values else None}
+
+
+ROW_SOURCES = {"plans": _plan_rows, "chats": _chat_rows, "timetables": _timetable_rows}
+
+
+def list_users():
+    """Everyone with a plan, a chat or a timetable."""
+    users = set(plan_store.list_users())
+    if os.path.isdir(CHATS_DIR):
+        users.update(name for name in os.listdir(CHATS_DIR) if os.path.isdir(os.path.join(CHATS_DIR, name)))
+    if os.path.isdir(TIMETABLES_DIR):
+        users.update(name[:-len(".json")] for name in os.listdir(TIMETABLES_DIR) if name.endswith(".json"))
+    return sorted(users)
+
+
+# =================================================================================================
+# EXPORT
+# =================================================================================================
+def _write_partition(path, rows, schema, fmt):
+    """Write one partition file; returns its size in bytes."""
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), path, compression="zstd")
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return os.path.getsize(path)
+
+
+def export(out_dir, fmt="parquet", users=None, datasets=DATASETS):
+    """Export the given users (default: everyone) and datasets; returns {dataset: {"rows", "files", "bytes"}}."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {FORMATS}.")
+    schemas = _schemas() if fmt == "parquet" else {}
+    report = {dataset: {"rows": 0, "files": 0, "bytes": 0} for dataset in datasets}
+    for username in users if users is not None else list_users():
+        for dataset in datasets:
+            partitions = {}
+            for row in ROW_SOURCES[dataset](username):
+                partitions.setdefault((row.get("date") or "unknown")[:7], []).append(row)
+            user_dir = os.path.join(out_dir, dataset, f"user={quote(username, safe='')}")
+            # A re-export replaces the user's earlier partitions rather than mixing with them
+            shutil.rmtree(user_dir, ignore_errors=True)
+            for month, rows in partitions.items():
+                os.makedirs(os.path.join(user_dir, f"date={month}"), exist_ok=True)
+                path = os.path.join(user_dir, f"date={month}", f"part-0.{fmt}")
+                report[dataset]["bytes"] += _write_partition(path, rows, schemas.get(dataset), fmt)
+                report[dataset]["rows"] += len(rows)
+                report[dataset]["files"] += 1
+    return report
+
+
+def export_user_archive(username, fmt="parquet"):
+    """One user's export as zip bytes (st.download_button keeps its data in memory regardless)."""
+    archive = io.BytesIO()
+    with tempfile.TemporaryDirectory() as out_dir:
+        export(out_dir, fmt, users=[username])
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for root, _, files in os.walk(out_dir):
+                for file_name in files:
+                    path = os.path.join(root, file_name)
+                    zf.write(path, os.path.relpath(path, out_dir))
+    return archive.getvalue()
+
+
+# =================================================================================================
+# IMPORT
+# =================================================================================================
+def _read_rows(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            yield from batch.to_pylist()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _import_plans(username, rows):
+    tasks = {task["id"]: task for task in plan_store.read_plan(username)}
+    for row in rows:
+        task = json.loads(row["extra"]) if row.get("extra") else {}
+        task.update({name: row[name] for name in PLAN_FIELDS if row.get(name) is not None})
+        task["done"] = bool(row.get("done"))
+        task.setdefault("id", plan_store.new_task_id())
+        tasks[task["id"]] = task
+    plan_store.save_plan(username, list(tasks.values()))
+
+
+def _import_chats(username, rows):
+    from helpers import context_window
+    chats = {}
+    for row in rows:
+        chats.setdefault(row["chat"], []).append(row)
+    for chat, messages in chats.items():
+        messages.sort(key=lambda row: row["seq"])
+        storage.write_json(os.path.join(CHATS_DIR, username, os.path.basename(chat)),
+                           [{"role": row["role"], "parts": row["text"]} for row in messages])
+        # The rolling summary described the replaced history (live sessions notice the new length themselves)
+        context_window.delete_summary(username, chat)
+
+
+def _import_timetables(username, rows):
+    latest = max((row["date"] or "" for row in rows), default=None)
+    slots = [row for row in rows if (row["date"] or "") == latest]
+    table = {"columns": ["Activity"], "index": [row["slot"] for row in slots],
+             "data": [[row["activity"]] for row in slots]}
+    storage.write_json(os.path.join(TIMETABLES_DIR, f"{username}.json"),
+                       {"date": latest, "timetable_json": json.dumps(table)})
+
+
+IMPORTERS = {"plans": _import_plans, "chats": _import_chats, "timetables": _import_timetables}
+
+
+def import_export(in_dir, datasets=DATASETS):
+    """Load an export back into the stores; returns {dataset: {"users", "rows"}}."""
+    report = {}
+    for dataset in datasets:
+        report[dataset] = {"users": 0, "rows": 0}
+        for user_dir in sorted(glob.glob(os.path.join(in_dir, dataset, "user=*"))):
+            username = unquote(os.path.basename(user_dir)[len("user="):])
+            paths = sorted(glob.glob(os.path.join(user_dir, "date=*", "part-*.*")))
+            rows = [row for path in paths for row in _read_rows(path)]
+            if not rows:
+                continue
+            IMPORTERS[dataset](username, rows)
+            report[dataset]["users"] += 1
+            report[dataset]["rows"] += len(rows)
+            logger.info("Imported %d %s rows for %s.", len(rows), dataset, username)
+    return report
+
+
+# =================================================================================================
+# COMMAND LINE
+# =================================================================================================
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Export or import plans, chats and timetables.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a partitioned export")
+    export_parser.add_argument("out_dir")
+    export_parser.add_argument("--format", choices=FORMATS, default="parquet")
+    export_parser.add_argument("--users", nargs="+", help="only these users (default: everyone)")
+    export_parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=list(DATASETS))
+    import_parser = commands.add_parser("import", help="load an export back into the stores")
+    import_parser.add_argument("in_dir")
+    import_parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=list(DATASETS))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        report = export(args.out_dir, args.format, args.users, args.datasets)
+        for dataset, counts in report.items():
+            print(f"{dataset}: {counts['rows']} rows in {counts['files']} files ({counts['bytes'] / 1e6:.2f} MB)")
+    else:
+        report = import_export(args.in_dir, args.datasets)
+        for dataset, counts in report.items():
+            print(f"{dataset}: {counts['rows']} rows for {counts['users']} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Shared Gemini client.
+
+Gemini is configured once per process and one GenerativeModel is kept per
+persona, so pages no longer configure the SDK and construct models on
+every rerun. Model name, generation settings and the request timeout for
+all personas live here.
+"""
+import logging
+import threading
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-1.5-flash-latest"
+REQUEST_TIMEOUT_S = 60
+REQUEST_OPTIONS = {"timeout": REQUEST_TIMEOUT_S}
+
+PEBBLE_SYSTEM_PROMPT = """
+You are a friendly, empathetic, and supportive AI companion for students. Your name is 'Pebble'.
+Your purpose is to be a safe space for students to talk about their study-related stress, anxieties, and mental health challenges.
+- Listen carefully and validate their feelings.
+- Offer gentle, constructive advice and coping strategies (like the Pomodoro Technique, mindfulness exercises, or breaking down large tasks).
+- Always be encouraging and positive.
+- NEVER claim to be a real therapist or a replacement for professional help.
+- If the user's problem seems serious or they mention severe distress, you MUST include the following disclaimer in your response:
+"I'm here to listen, but I'm an AI. If you're feeling overwhelmed, please consider talking to a trusted adult or a mental health professional. You are not alone."
+"""
+
+PERSONAS = {
+    # AI Tools "Doubt-Solving Bestie" tab
+    "assistant": {
+        "system_instruction": None,
+        "generation_config": {"temperature": 0.7, "max_output_tokens": 2048},
+    },
+    # Mental Health Chatbot
+    "pebble": {
+        "system_instruction": PEBBLE_SYSTEM_PROMPT,
+        "generation_config": {"temperature": 0.9, "max_output_tokens": 1024},
+    },
+    # Rolling chat summaries (helpers/context_window.py)
+    "summarizer": {
+        "system_instruction": None,
+        "generation_config": {"temperature": 0.2, "max_output_tokens": 512},
+    },
+}
+
+_lock = threading.Lock()
+_configured = False
+_models = {}
+
+
+def get_model(persona="assistant"):
+    """Return the shared GenerativeModel for a persona, configuring Gemini on first use."""
+    global _configured
+    model = _models.get(persona)
+    if model is not None:
+        return model
+    with _lock:
+        import google.generativeai as genai
+        if not _configured:
+            genai.configure(api_key=st.secrets.get("GEMINI_API_KEY", None))
+            _configured = True
+        if persona not in _models:
+            settings = PERSONAS[persona]
+            _models[persona] = genai.GenerativeModel(
+                MODEL_NAME,
+                system_instruction=settings["system_instruction"],
+                generation_config=settings["generation_config"],
+            )
+            logger.info("Created Gemini model for persona %r", persona)
+        return _models[persona]
@@ -0,0 +1,163 @@
+"""Chunked authenticated encryption for the Document Locker.
+
+A locker file is a header followed by independently sealed chunks, so a
+document of any size is encrypted and decrypted with CHUNK_SIZE of memory:
+
+    header: MAGIC | version (1 byte) | chunk size (4 bytes) | file salt (16 bytes)
+    chunk:  final flag (1 byte) | ciphertext length (4 bytes) | AES-256-GCM ciphertext + tag
+
+Each file gets its own AES key, derived with HKDF from the user's locker key
+and the random file salt, so the chunk counter can serve as the GCM nonce.
+The header and the final flag are authenticated with every chunk, which
+makes reordered, truncated or spliced files fail to decrypt.
+
+Files written before this format (a single Fernet token) have no MAGIC and
+are still readable through decrypt_file().
+"""
+import os
+import struct
+import tempfile
+import threading
+import time
+
+MAGIC = b"SBLK"
+VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+SALT_SIZE = 16
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+TAG_SIZE = 16
+
+_HEADER = struct.Struct(">4sBI16s")
+_FRAME = struct.Struct(">?I")
+
+
+class LockerFormatError(ValueError):
+    """The file is damaged, truncated, or was not encrypted with this key."""
+
+
+def _file_cipher(key, salt):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    file_key = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"study-buddy locker file").derive(key)
+    return AESGCM(file_key)
+
+
+def _nonce(counter):
+    return counter.to_bytes(12, "big")
+
+
+def is_chunked(path):
+    """Whether the file is in the chunked format (as opposed to a legacy Fernet token)."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# =================================================================================================
+# ENCRYPTION
+# =================================================================================================
+def encrypt_stream(key, src, dst, chunk_size=CHUNK_SIZE):
+    """Encrypt the readable binary stream src into dst; returns the number of plaintext bytes."""
+    salt = os.urandom(SALT_SIZE)
+    header = _HEADER.pack(MAGIC, VERSION, chunk_size, salt)
+    cipher = _file_cipher(key, salt)
+    dst.write(header)
+    total, counter = 0, 0
+    chunk = src.read(chunk_size)
+    while True:
+        # Read one chunk ahead so the last chunk can be flagged as final
+        next_chunk = src.read(chunk_size) if len(chunk) == chunk_size else b""
+        final = not next_chunk
+        sealed = cipher.encrypt(_nonce(counter), chunk, header + _FRAME.pack(final, len(chunk) + TAG_SIZE))
+        dst.write(_FRAME.pack(final, len(sealed)))
+        dst.write(sealed)
+        total += len(chunk)
+        counter += 1
+        if final:
+            return total
+        chunk = next_chunk
+
+
+def encrypt_file(key, src, path, chunk_size=CHUNK_SIZE):
+    """Encrypt src to path atomically; returns (plaintext bytes, MB/s)."""
+    start = time.perf_counter()
+    # Unique per writer, so concurrent uploads of the same blob don't share a temp file
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as dst:
+        total = encrypt_stream(key, src, dst, chunk_size)
+    os.replace(tmp_path, path)
+    elapsed = time.perf_counter() - start
+    return total, (total / 1e6) / elapsed if elapsed else 0.0
+
+
+# =================================================================================================
+# DECRYPTION
+# =================================================================================================
+def _read_exact(src, size):
+    data = src.read(size)
+    if len(data) != size:
+        raise LockerFormatError("File is truncated.")
+    return data
+
+
+def decrypt_stream(key, src):
+    """Yield the plaintext chunks of a chunked locker stream."""
+    from cryptography.exceptions import InvalidTag
+    header = _read_exact(src, _HEADER.size)
+    magic, version, chunk_size, salt = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise LockerFormatError("Not a chunked locker file.")
+    cipher = _file_cipher(key, salt)
+    counter = 0
+    while True:
+        final, length = _FRAME.unpack(_read_exact(src, _FRAME.size))
+        if length > chunk_size + TAG_SIZE:
+            raise LockerFormatError("Chunk is larger than the header allows.")
+        try:
+            yield cipher.decrypt(_nonce(counter), _read_exact(src, length), header + _FRAME.pack(final, length))
+        except InvalidTag:
+            raise LockerFormatError("File is damaged or was encrypted with another key.") from None
+        counter += 1
+        if final:
+            if src.read(1):
+                raise LockerFormatError("Unexpected data after the final chunk.")
+            return
+
+
+def decrypt_file(key, path, legacy_fernet=None):
+    """Yield the plaintext of a locker file, chunked or legacy Fernet (which is decrypted whole)."""
+    if not is_chunked(path):
+        from cryptography.fernet import InvalidToken
+        if legacy_fernet is None:
+            raise LockerFormatError("Legacy file needs the Fernet key.")
+        with open(path, "rb") as f:
+            try:
+                yield legacy_fernet.decrypt(f.read())
+            except InvalidToken:
+                raise LockerFormatError("File is damaged or was encrypted with another key.") from None
+        return
+    with open(path, "rb") as f:
+        yield from decrypt_stream(key, f)
+
+
+def spool(chunks):
+    """Write an iterable of plaintext chunks into a rewound temporary file.
+
+    Up to SPOOL_MEMORY_BYTES stay in memory; larger documents spill to disk,
+    so decrypting never holds more than one chunk beyond that. The caller
+    closes the returned file, which deletes it.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    try:
+        for chunk in chunks:
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+
+def decrypt_to_spool(key, path, legacy_fernet=None):
+    """Decrypt a locker file chunk by chunk into a rewound temporary file (see spool())."""
+    return spool(decrypt_file(key, path, legacy_fernet))
@@ -0,0 +1,110 @@
+"""Envelope keys for the Document Locker.
+
+Documents are encrypted with a random per-user data key. The data key is
+stored only wrapped (AES-GCM) by a key-encryption key derived from the
+user's password with PBKDF2 and a per-user random salt; the record lives in
+users.db. Changing the password or the KDF cost rewraps that one record and
+never touches the documents.
+
+Users who already had documents when this was introduced keep the key their
+files were encrypted with (derived from the old global salt) as their data
+key, so nothing needs re-encrypting.
+"""
+import base64
+import logging
+import os
+import time
+
+from helpers import user_store
+
+logger = logging.getLogger(__name__)
+
+# PBKDF2-SHA256 rounds for new and rewrapped records; see benchmarks/kdf_cost.py
+KDF_ITERATIONS = 480000
+SALT_SIZE = 16
+KEY_SIZE = 32
+NONCE_SIZE = 12
+
+LEGACY_SALT = b'your_project_specific_salt_for_this_prototype'
+LEGACY_ITERATIONS = 480000
+
+
+class LockerKeyError(ValueError):
+    """The password does not unwrap the stored locker key."""
+
+
+def derive_key(password, salt, iterations=KDF_ITERATIONS):
+    """PBKDF2-SHA256 key-encryption key for a password."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt, iterations=iterations)
+    return kdf.derive(password.encode())
+
+
+def _wrap(kek, data_key, username):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + AESGCM(kek).encrypt(nonce, data_key, username.encode())
+
+
+def _unwrap(kek, wrapped_key, username):
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    try:
+        return AESGCM(kek).decrypt(wrapped_key[:NONCE_SIZE], wrapped_key[NONCE_SIZE:], username.encode())
+    except InvalidTag:
+        raise LockerKeyError("Password does not match the locker key.") from None
+
+
+def _store(username, password, data_key, replace=True):
+    salt = os.urandom(SALT_SIZE)
+    wrapped_key = _wrap(derive_key(password, salt), data_key, username)
+    return user_store.save_locker_key(username, salt, KDF_ITERATIONS, wrapped_key, replace=replace)
+
+
+def unlock(username, password, has_documents=False):
+    """Return the user's raw data key, creating the wrapped record on first use.
+
+    has_documents tells a first unlock to adopt the legacy key that existing
+    files were encrypted with instead of generating a fresh one.
+    """
+    record = user_store.get_locker_key(username)
+    if record is None:
+        if has_documents:
+            data_key = derive_key(password, LEGACY_SALT, LEGACY_ITERATIONS)
+        else:
+            data_key = os.urandom(KEY_SIZE)
+        if _store(username, password, data_key, replace=False):
+            logger.info("Created locker key record for %s.", username)
+            return data_key
+        # Another session created the record first; use theirs
+        record = user_store.get_locker_key(username)
+    data_key = _unwrap(derive_key(password, record["salt"], record["iterations"]),
+                       record["wrapped_key"], username)
+    if record["iterations"] != KDF_ITERATIONS:
+        _store(username, password, data_key)
+        logger.info("Rewrapped locker key for %s at %d iterations.", username, KDF_ITERATIONS)
+    return data_key
+
+
+def rekey(username, old_password, new_password):
+    """Rewrap the data key under a new password (e.g. after a password change)."""
+    data_key = unlock(username, old_password)
+    _store(username, new_password, data_key)
+
+
+def fernet_for(data_key):
+    """Fernet instance for files written before the chunked format."""
+    from cryptography.fernet import Fernet
+    return Fernet(base64.urlsafe_b64encode(data_key))
+
+
+def time_unlock(iterations, samples=3):
+    """Best-of-N seconds for one key derivation at the given cost."""
+    best = None
+    for _ in range(samples):
+        start = time.perf_counter()
+        derive_key("benchmark-password", os.urandom(SALT_SIZE), iterations)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,414 @@
+"""Content-addressed document storage for the Document Locker.
+
+Documents are stored once per distinct content as encrypted blobs under
+user_documents/<username>/blobs/<blob id>. The blob id is an HMAC-SHA256 of
+the plaintext under a key derived from the user's data key, so identical
+uploads share a blob without the id revealing a plain content hash.
+
+A manifest, itself encrypted with the user's data key, maps each document
+name to its blob, size, upload time and content type, and keeps a reference
+count and the on-disk size per blob; a blob is deleted when its last name is
+removed or replaced. Listing and usage read only the (cached) manifest,
+never the directory.
+
+Compressible content is zlib-compressed before encryption. The first byte of
+a blob's plaintext says whether the rest is compressed, so a blob decodes the
+same way whichever name it was uploaded under.
+
+Documents saved as <name>.encrypted before blobs existed are picked up into
+the manifest on first use and read through their original file.
+"""
+import hashlib
+import hmac
+import io
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from helpers import locker_crypto, storage
+
+logger = logging.getLogger(__name__)
+
+DOCS_DIR = "user_documents"
+COMPRESS_SAMPLE_BYTES = 64 * 1024
+COMPRESS_MAX_RATIO = 0.9    # compress only if the sample shrinks to at most this fraction
+COMPRESSION_LEVEL = 6
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".7z", ".avi", ".docx", ".gif", ".gz", ".jpeg", ".jpg", ".m4a", ".mkv", ".mov", ".mp3", ".mp4",
+    ".png", ".pptx", ".rar", ".webm", ".webp", ".xlsx", ".zip",
+}
+
+# Hashing, zlib and AES-GCM release the GIL, so batch uploads scale across threads
+UPLOAD_WORKERS = min(4, os.cpu_count() or 1)
+STALE_TMP_S = 3600
+
+RAW, ZLIB = b"-", b"z"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+# =================================================================================================
+# FILE LAYOUT & LOCKING
+# =================================================================================================
+def _user_dir(username):
+    return os.path.join(DOCS_DIR, username.strip())
+
+
+def _blob_dir(username):
+    return os.path.join(_user_dir(username), "blobs")
+
+
+def _blob_path(username, blob_id):
+    return os.path.join(_blob_dir(username), blob_id)
+
+
+def _manifest_path(username):
+    return os.path.join(_user_dir(username), "manifest.enc")
+
+
+def _plain_manifest_path(username):
+    # Unencrypted manifest written before manifests were encrypted
+    return os.path.join(_user_dir(username), "manifest.json")
+
+
+def _user_lock(username):
+    with _locks_guard:
+        return _locks.setdefault(username, threading.RLock())
+
+
+class ManifestUnreadable(Exception):
+    """The manifest exists but does not decrypt with the given key."""
+
+
+def _guess_content_type(name):
+    return mimetypes.guess_type(name)[0] or DEFAULT_CONTENT_TYPE
+
+
+def _load_manifest(username, data_key, copy=True):
+    """Return {"files": {name: entry}, "refs": {blob id: count}, "stored": {blob id: bytes}}.
+
+    Older layouts are adopted once.
+
+    With copy=False the cached manifest itself is returned and must not be changed.
+    """
+    def parse(raw):
+        try:
+            return json.loads(b"".join(locker_crypto.decrypt_stream(data_key, io.BytesIO(raw))))
+        except locker_crypto.LockerFormatError as e:
+            # Not a ValueError, so storage won't treat it as missing and let a save overwrite it
+            raise ManifestUnreadable(str(e)) from e
+
+    fingerprint = hashlib.sha256(data_key).hexdigest()
+    manifest = storage.read(_manifest_path(username), parse, copy=copy, context=fingerprint)
+    if manifest is not None:
+        return manifest
+    manifest = storage.read_json(_plain_manifest_path(username)) or {"files": {}, "refs": {}}
+    manifest.setdefault("stored", {})
+    user_dir = _user_dir(username)
+    if os.path.isdir(user_dir):
+        for file_name in sorted(os.listdir(user_dir)):
+            name = file_name[:-len(".encrypted")]
+            if file_name.endswith(".encrypted") and name not in manifest["files"]:
+                path = os.path.join(user_dir, file_name)
+                # Legacy sizes are the encrypted file size; the plaintext size isn't known without decrypting
+                manifest["files"][name] = {"legacy": file_name, "size": os.path.getsize(path),
+                                           "uploaded": os.path.getmtime(path)}
+    for name, entry in manifest["files"].items():
+        entry.setdefault("uploaded", None)
+        entry.setdefault("content_type", _guess_content_type(name))
+    return manifest
+
+
+def _save_manifest(username, data_key, manifest):
+    # Record each blob's size on disk once, so usage() never has to stat the blobs
+    stored = manifest.setdefault("stored", {})
+    for blob_id in manifest["refs"]:
+        if blob_id not in stored and os.path.exists(_blob_path(username, blob_id)):
+            stored[blob_id] = os.path.getsize(_blob_path(username, blob_id))
+    for blob_id in set(stored) - set(manifest["refs"]):
+        del stored[blob_id]
+    path = _manifest_path(username)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    raw = json.dumps(manifest, separators=(",", ":")).encode()
+    locker_crypto.encrypt_file(data_key, io.BytesIO(raw), path)
+    storage.invalidate(path)
+    if os.path.exists(_plain_manifest_path(username)):
+        os.remove(_plain_manifest_path(username))
+        storage.invalidate(_plain_manifest_path(username))
+
+
+# =================================================================================================
+# BLOB IDS & COMPRESSION
+# =================================================================================================
+def _blob_key(data_key):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"study-buddy locker blob id").derive(data_key)
+
+
+def blob_id_for(data_key, src, on_read=None):
+    """Keyed content hash of a seekable stream (rewound afterwards), and its length.
+
+    on_read(bytes so far) is called after every chunk.
+    """
+    mac = hmac.new(_blob_key(data_key), digestmod=hashlib.sha256)
+    size = 0
+    src.seek(0)
+    for chunk in iter(lambda: src.read(locker_crypto.CHUNK_SIZE), b""):
+        mac.update(chunk)
+        size += len(chunk)
+        if on_read:
+            on_read(size)
+    src.seek(0)
+    return mac.hexdigest(), size
+
+
+def _should_compress(name, src):
+    if os.path.splitext(name)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return False
+    sample = src.read(COMPRESS_SAMPLE_BYTES)
+    src.seek(0)
+    return bool(sample) and len(zlib.compress(sample, 1)) <= len(sample) * COMPRESS_MAX_RATIO
+
+
+class _Encoder:
+    """Readable stream of a blob's plaintext: the compression flag byte, then the (compressed) content."""
+
+    def __init__(self, src, compress, on_read=None):
+        self._src = src
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL) if compress else None
+        self._buffer = bytearray(ZLIB if compress else RAW)
+        self._eof = False
+        self._on_read = on_read
+        self._consumed = 0
+
+    def read(self, size):
+        while len(self._buffer) < size and not self._eof:
+            chunk = self._src.read(locker_crypto.CHUNK_SIZE)
+            if not chunk:
+                self._eof = True
+                if self._compressor:
+                    self._buffer += self._compressor.flush()
+            else:
+                self._buffer += self._compressor.compress(chunk) if self._compressor else chunk
+                self._consumed += len(chunk)
+                if self._on_read:
+                    self._on_read(self._consumed)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _decode(chunks):
+    """Undo _Encoder on an iterable of decrypted chunks."""
+    decompressor = None
+    first = True
+    for chunk in chunks:
+        if first:
+            flag, chunk = chunk[:1], chunk[1:]
+            decompressor = zlib.decompressobj() if flag == ZLIB else None
+            first = False
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        if chunk:
+            yield chunk
+    if decompressor:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+# =================================================================================================
+# PUBLIC API
+# =================================================================================================
+def put(username, data_key, name, src, content_type=None, progress=None):
+    """Store a document under name, reusing an existing blob with the same content.
+
+    Storing the same content under the same name again changes nothing.
+    progress(fraction) is called as the upload is hashed and then encrypted.
+    Returns {"size", "deduplicated", "mb_per_s"}; mb_per_s is 0 for deduplicated uploads.
+    """
+    start = time.perf_counter()
+    total = src.seek(0, os.SEEK_END) or 1
+    src.seek(0)
+
+    def report(phase):
+        # Hashing is the first half of the work, encrypting the second
+        if progress is None:
+            return None
+        return lambda done: progress((phase + min(done / total, 1.0)) / 2)
+
+    def encrypt():
+        os.makedirs(_blob_dir(username), exist_ok=True)
+        src.seek(0)
+        encoder = _Encoder(src, _should_compress(name, src), on_read=report(1))
+        locker_crypto.encrypt_file(data_key, encoder, _blob_path(username, blob_id))
+
+    blob_id, size = blob_id_for(data_key, src, on_read=report(0))
+    with _user_lock(username):
+        manifest = _load_manifest(username, data_key, copy=False)
+        deduplicated = blob_id in manifest["refs"] and os.path.exists(_blob_path(username, blob_id))
+        unchanged = deduplicated and manifest["files"].get(name, {}).get("blob") == blob_id
+    if unchanged:
+        if progress:
+            progress(1.0)
+        return {"size": size, "deduplicated": True, "mb_per_s": 0.0}
+    if not deduplicated:
+        # Encrypt outside the lock so a batch of uploads runs in parallel
+        encrypt()
+    with _user_lock(username):
+        manifest = _load_manifest(username, data_key)
+        if not os.path.exists(_blob_path(username, blob_id)):
+            # A delete removed the shared blob while we weren't holding the lock
+            encrypt()
+        if progress:
+            progress(1.0)
+        _unlink_name(username, manifest, name)
+        manifest["files"][name] = {
+            "blob": blob_id,
+            "size": size,
+            "uploaded": time.time(),
+            "content_type": content_type or _guess_content_type(name),
+        }
+        manifest["refs"][blob_id] = manifest["refs"].get(blob_id, 0) + 1
+        _save_manifest(username, data_key, manifest)
+    elapsed = time.perf_counter() - start
+    return {
+        "size": size,
+        "deduplicated": deduplicated,
+        "mb_per_s": 0.0 if deduplicated or not elapsed else (size / 1e6) / elapsed,
+    }
+
+
+def put_many(username, data_key, uploads, max_workers=UPLOAD_WORKERS, on_progress=None, poll_s=0.25):
+    """Store several documents in parallel on a bounded thread pool.
+
+    uploads is a list of (name, src, content_type). on_progress(fractions),
+    with one fraction per upload, is called on the calling thread every poll_s
+    seconds, so it may update Streamlit elements. Returns one item per upload:
+    put()'s result dict, or the exception that upload failed with. Blobs left
+    behind by failed uploads are swept afterwards.
+    """
+    fractions = [0.0] * len(uploads)
+
+    def track(index):
+        def update(fraction):
+            fractions[index] = fraction
+        return update
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="locker-upload") as pool:
+        futures = [
+            pool.submit(put, username, data_key, name, src, content_type=content_type, progress=track(index))
+            for index, (name, src, content_type) in enumerate(uploads)
+        ]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=poll_s)
+            if on_progress:
+                on_progress(list(fractions))
+    results = []
+    for (name, _, _), future in zip(uploads, futures):
+        error = future.exception()
+        if error is not None:
+            logger.warning("Locker upload of %r for %s failed: %s", name, username, error)
+        results.append(error if error is not None else future.result())
+    if any(isinstance(result, Exception) for result in results):
+        collect_garbage(username, data_key)
+    return results
+
+
+def _unlink_name(username, manifest, name):
+    """Drop name from the manifest, deleting its blob (or legacy file) once nothing refers to it."""
+    entry = manifest["files"].pop(name, None)
+    if entry is None:
+        return
+    if "legacy" in entry:
+        path = os.path.join(_user_dir(username), entry["legacy"])
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    blob_id = entry["blob"]
+    manifest["refs"][blob_id] = manifest["refs"].get(blob_id, 1) - 1
+    if manifest["refs"][blob_id] <= 0:
+        del manifest["refs"][blob_id]
+        if os.path.exists(_blob_path(username, blob_id)):
+            os.remove(_blob_path(username, blob_id))
+
+
+def delete(username, data_key, name):
+    with _user_lock(username):
+        manifest = _load_manifest(username, data_key)
+        _unlink_name(username, manifest, name)
+        _save_manifest(username, data_key, manifest)
+
+
+def list_documents(username, data_key, name_filter="", offset=0, limit=None):
+    """Return (page of (name, entry) pairs sorted by name, number of matching documents).
+
+    name_filter is a case-insensitive substring. Entries are shared with the
+    manifest cache and must not be changed.
+    """
+    files = _load_manifest(username, data_key, copy=False)["files"]
+    needle = name_filter.strip().lower()
+    names = sorted(name for name in files if needle in name.lower())
+    page = names[offset:None if limit is None else offset + limit]
+    return [(name, files[name]) for name in page], len(names)
+
+
+def has_documents(username):
+    """Whether the user has anything stored, without needing their key."""
+    user_dir = _user_dir(username)
+    return os.path.isdir(user_dir) and bool(os.listdir(user_dir))
+
+
+def open_document(username, data_key, name, legacy_fernet=None):
+    """Decrypt a document into a rewound spooled temp file (see locker_crypto.spool())."""
+    entry = _load_manifest(username, data_key, copy=False)["files"][name]
+    if "legacy" in entry:
+        return locker_crypto.decrypt_to_spool(data_key, os.path.join(_user_dir(username), entry["legacy"]),
+                                              legacy_fernet)
+    chunks = locker_crypto.decrypt_file(data_key, _blob_path(username, entry["blob"]))
+    return locker_crypto.spool(_decode(chunks))
+
+
+def collect_garbage(username, data_key):
+    """Delete blob files the manifest doesn't refer to (left by interrupted uploads); returns bytes freed."""
+    freed = 0
+    with _user_lock(username):
+        refs = _load_manifest(username, data_key, copy=False)["refs"]
+        blob_dir = _blob_dir(username)
+        if not os.path.isdir(blob_dir):
+            return 0
+        for file_name in os.listdir(blob_dir):
+            path = os.path.join(blob_dir, file_name)
+            if file_name.endswith(".tmp") and time.time() - os.path.getmtime(path) < STALE_TMP_S:
+                continue    # probably an upload still being encrypted
+            if file_name not in refs:
+                freed += os.path.getsize(path)
+                os.remove(path)
+    if freed:
+        logger.info("Removed %d unreferenced locker bytes for %s.", freed, username)
+    return freed
+
+
+def usage(username, data_key):
+    """Return (logical bytes, physical bytes): document sizes vs. what the blobs take on disk."""
+    manifest = _load_manifest(username, data_key, copy=False)
+    files = manifest["files"].values()
+    logical = sum(entry["size"] for entry in files)
+    physical = sum(entry["size"] for entry in files if "legacy" in entry)
+    stored = manifest.get("stored", {})
+    for blob_id in manifest["refs"]:
+        if blob_id in stored:
+            physical += stored[blob_id]
+        elif os.path.exists(_blob_path(username, blob_id)):
+            # Manifests saved before sizes were recorded, until their next save
+            physical += os.path.getsize(_blob_path(username, blob_id))
+    return logical, physical
@@ -0,0 +1,388 @@
+"""Log-structured study plan store.
+
+Each user's plan is a snapshot (user_plans/<username>.json, the same task
+list the app has always written) plus an append-only journal
+(user_plans/<username>.journal) of add/update/delete records. Adding or
+ticking off a task appends one line instead of rewriting the whole plan;
+loading replays the journal on top of the snapshot. Once a journal grows
+past COMPACT_THRESHOLD_BYTES it is folded back into the snapshot on a
+background thread.
+
+Every task carries a stable "id" (a UUID hex string) that journal records
+and the UI refer to, so list positions never identify a task. The first
+journal line records a digest of the snapshot it applies to, so a journal
+left behind by an interrupted compaction is recognised as already folded in
+and is not replayed twice.
+
+Next to the plan, user_plans/<username>.rollup.json keeps per-day totals
+(tasks, done, and both per priority) that every add/update/delete adjusts in
+place, so statistics read O(days) numbers instead of the whole plan. The
+rollup records which snapshot and journal length it reflects and is rebuilt
+from the plan whenever they don't match (e.g. after a crash between the two
+writes).
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import uuid
+
+from helpers import storage
+
+logger = logging.getLogger(__name__)
+
+PLANS_DIR = "user_plans"
+COMPACT_THRESHOLD_BYTES = 64 * 1024
+
+_locks = {}
+_locks_guard = threading.Lock()
+_compacting = set()
+
+
+# =================================================================================================
+# FILE LAYOUT & LOCKING
+# =================================================================================================
+def _snapshot_path(username):
+    return os.path.join(PLANS_DIR, f"{username}.json")
+
+
+def _journal_path(username):
+    return os.path.join(PLANS_DIR, f"{username}.journal")
+
+
+def _rollup_path(username):
+    return os.path.join(PLANS_DIR, f"{username}.rollup.json")
+
+
+def _journal_bytes(username):
+    try:
+        return os.path.getsize(_journal_path(username))
+    except FileNotFoundError:
+        return 0
+
+
+def _user_lock(username):
+    with _locks_guard:
+        return _locks.setdefault(username, threading.RLock())
+
+
+def _read_snapshot(username):
+    """Return (digest of the raw bytes, parsed task list); missing or corrupt files are empty."""
+    path = _snapshot_path(username)
+    return storage.file_digest(path), storage.read_json(path, [])
+
+
+def _parse_journal(raw):
+    """Return (header, records) of a journal, skipping unreadable lines."""
+    lines = raw.decode("utf-8", errors="replace").splitlines()
+    header = {}
+    if lines:
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError:
+            pass
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A torn final write from a crash; everything before it is intact
+            logger.warning("Skipping unreadable plan journal record.")
+    return header, records
+
+
+# =================================================================================================
+# REPLAY
+# =================================================================================================
+def new_task_id():
+    return uuid.uuid4().hex
+
+
+def _apply(tasks, record):
+    """Apply one journal record to an id -> task dict (insertion ordered)."""
+    op = record.get("op")
+    task_id = record.get("id")
+    if task_id is None and "index" in record:
+        # Records written before tasks had ids address them by position
+        ids = list(tasks)
+        task_id = ids[record["index"]] if 0 <= record["index"] < len(ids) else None
+    if op == "add":
+        task = record["task"]
+        tasks[task.get("id") or new_task_id()] = task
+    elif op == "update" and task_id in tasks:
+        tasks[task_id].update(record["fields"])
+    elif op == "delete":
+        tasks.pop(task_id, None)
+
+
+def _replay(username):
+    """Return (task list, whether any task was missing an id)."""
+    digest, plan = _read_snapshot(username)
+    tasks, assigned = {}, False
+    for task in plan:
+        if not task.get("id"):
+            task["id"] = new_task_id()
+            assigned = True
+        tasks[task["id"]] = task
+    header, records = storage.read(_journal_path(username), _parse_journal, ({}, []))
+    # A journal for an older snapshot means compaction was interrupted after the swap
+    if header.get("op") == "base" and header.get("digest") == digest:
+        for record in records:
+            try:
+                _apply(tasks, record)
+            except (KeyError, TypeError, AttributeError):
+                logger.warning("Skipping malformed journal record for %s.", username)
+    for task_id, task in tasks.items():
+        if task.get("id") != task_id:
+            task["id"] = task_id
+            assigned = True
+    return list(tasks.values()), assigned
+
+
+# =================================================================================================
+# WRITING
+# =================================================================================================
+def _write_snapshot(username, plan_data):
+    """Atomically replace the snapshot and start an empty journal."""
+    storage.write_json(_snapshot_path(username), plan_data)
+    with open(_journal_path(username), "w"):
+        pass
+    _write_rollup(username, _build_rollup(plan_data))
+
+
+def _append(username, record, adjust_rollup=None):
+    """Append a journal record; adjust_rollup(days) applies the same change to the daily rollup."""
+    with _user_lock(username):
+        days = _current_rollup(username)
+        os.makedirs(PLANS_DIR, exist_ok=True)
+        journal_path = _journal_path(username)
+        with open(journal_path, "a") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({"op": "base", "digest": storage.file_digest(_snapshot_path(username))}) + "\n")
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            size = f.tell()
+        if adjust_rollup:
+            adjust_rollup(days)
+        _write_rollup(username, days)
+    if size > COMPACT_THRESHOLD_BYTES:
+        _schedule_compaction(username)
+
+
+def _compact(username):
+    try:
+        with _user_lock(username):
+            _write_snapshot(username, _replay(username)[0])
+        logger.info("Compacted plan journal for %s.", username)
+    except OSError as e:
+        logger.warning("Plan compaction for %s failed: %s", username, e)
+    finally:
+        with _locks_guard:
+            _compacting.discard(username)
+
+
+def _schedule_compaction(username):
+    with _locks_guard:
+        if username in _compacting:
+            return
+        _compacting.add(username)
+    threading.Thread(target=_compact, args=(username,), daemon=True).start()
+
+
+# =================================================================================================
+# PUBLIC API
+# =================================================================================================
+def load_plan(username):
+    """Return the user's current task list (snapshot plus journal)."""
+    with _user_lock(username):
+        plan, assigned = _replay(username)
+        if assigned:
+            # Persist ids given to older tasks so they stay stable across loads
+            _write_snapshot(username, plan)
+        return plan
+
+
+def read_plan(username):
+    """Return the current task list without writing anything (for offline readers like analytics)."""
+    with _user_lock(username):
+        return _replay(username)[0]
+
+
+def list_users():
+    """Usernames that have a plan snapshot or journal."""
+    if not os.path.isdir(PLANS_DIR):
+        return []
+    names = set()
+    for file_name in os.listdir(PLANS_DIR):
+        stem, ext = os.path.splitext(file_name)
+        if ext in (".json", ".journal") and not stem.endswith(".rollup"):
+            names.add(stem)
+    return sorted(names)
+
+
+def plan_signature(username):
+    """(mtime_ns, size) of the snapshot and journal; changes whenever the plan does."""
+    signature = []
+    for path in (_snapshot_path(username), _journal_path(username)):
+        try:
+            st = os.stat(path)
+            signature += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            signature += [0, 0]
+    return signature
+
+
+def save_plan(username, plan_data):
+    """Replace the whole plan (used for bulk rewrites; single edits should append)."""
+    with _user_lock(username):
+        _write_snapshot(username, plan_data)
+
+
+def add_task(username, task):
+    """Append a new task to the user's plan, giving it an id if it has none."""
+    task.setdefault("id", new_task_id())
+    _append(username, {"op": "add", "task": task}, lambda days: _count(days, task, 1))
+    return task
+
+
+def _find_task(username, task_id):
+    return next((task for task in load_plan(username) if task["id"] == task_id), None)
+
+
+def update_task(username, task_id, previous=None, **fields):
+    """Change fields (e.g. done=True) of the task with the given id.
+
+    previous is the task as it was before the change; pass it when it's at
+    hand to spare loading the plan to keep the daily rollup in step.
+    """
+    with _user_lock(username):
+        previous = previous or _find_task(username, task_id)
+
+        def adjust(days):
+            if previous is not None:
+                _count(days, previous, -1)
+                _count(days, {**previous, **fields}, 1)
+
+        _append(username, {"op": "update", "id": task_id, "fields": fields}, adjust)
+
+
+def delete_task(username, task_id, previous=None):
+    """Remove the task with the given id (previous: the task, as for update_task)."""
+    with _user_lock(username):
+        previous = previous or _find_task(username, task_id)
+
+        def adjust(days):
+            if previous is not None:
+                _count(days, previous, -1)
+
+        _append(username, {"op": "delete", "id": task_id}, adjust)
+
+
+# =================================================================================================
+# DAILY ROLLUPS
+# =================================================================================================
+def _count(days, task, sign):
+    """Add (sign=1) or remove (sign=-1) one task's contribution to the per-day totals."""
+    date_str = task.get("date")
+    if not date_str:
+        return
+    day = days.setdefault(date_str, {"total": 0, "done": 0, "by_priority": {}})
+    done = sign if task.get("done") else 0
+    priority = day["by_priority"].setdefault(task.get("priority") or "None", {"total": 0, "done": 0})
+    for totals in (day, priority):
+        totals["total"] += sign
+        totals["done"] += done
+    if priority["total"] <= 0:
+        del day["by_priority"][task.get("priority") or "None"]
+    if day["total"] <= 0:
+        del days[date_str]
+
+
+def _build_rollup(plan):
+    days = {}
+    for task in plan:
+        _count(days, task, 1)
+    return days
+
+
+def _write_rollup(username, days):
+    storage.write_json(_rollup_path(username), {
+        "snapshot": storage.file_digest(_snapshot_path(username)),
+        "journal_bytes": _journal_bytes(username),
+        "days": days,
+    }, indent=None)
+
+
+def _current_rollup(username, copy=True):
+    """Return the per-day totals, rebuilding them if they don't match the snapshot and journal."""
+    rollup = storage.read_json(_rollup_path(username), copy=copy)
+    if (rollup and rollup.get("snapshot") == storage.file_digest(_snapshot_path(username))
+            and rollup.get("journal_bytes") == _journal_bytes(username)):
+        return rollup["days"]
+    days = _build_rollup(_replay(username)[0])
+    _write_rollup(username, days)
+    logger.info("Rebuilt daily rollup for %s.", username)
+    return days
+
+
+def daily_rollup(username):
+    """Return {"YYYY-MM-DD": {"total", "done", "by_priority": {priority: {"total", "done"}}}}.
+
+    The result is shared with the cache and must not be changed.
+    """
+    with _user_lock(username):
+        return _current_rollup(username, copy=False)
+
+
+# =================================================================================================
+# IN-MEMORY INDEX
+# =================================================================================================
+class PlanIndex:
+    """id -> task and date -> task ids lookups over a loaded plan.
+
+    The index shares the task dicts with the plan list, so a change made
+    through update() is visible in both. `version` increases with every
+    change, for callers that memoize views of the plan.
+    """
+
+    def __init__(self, plan=()):
+        self.by_id = {}
+        self.by_date = {}
+        self.dates = []     # sorted keys of by_date, for range queries
+        self.version = 0
+        for task in plan:
+            self.add(task)
+
+    def _index_date(self, date_str, task_id):
+        if date_str not in self.by_date:
+            self.by_date[date_str] = []
+            if date_str is not None:
+                bisect.insort(self.dates, date_str)
+        self.by_date[date_str].append(task_id)
+
+    def add(self, task):
+        self.by_id[task["id"]] = task
+        self._index_date(task.get("date"), task["id"])
+        self.version += 1
+
+    def get(self, task_id):
+        return self.by_id.get(task_id)
+
+    def for_date(self, date_str):
+        """Return the tasks scheduled on a date (YYYY-MM-DD) in insertion order."""
+        return [self.by_id[task_id] for task_id in self.by_date.get(date_str, ())]
+
+    def in_range(self, start, end):
+        """Return the tasks dated from start up to (not including) end, both YYYY-MM-DD."""
+        first = bisect.bisect_left(self.dates, start)
+        last = bisect.bisect_left(self.dates, end)
+        return [task for date_str in self.dates[first:last] for task in self.for_date(date_str)]
+
+    def update(self, task_id, **fields):
+        task = self.by_id[task_id]
+        if "date" in fields and fields["date"] != task.get("date"):
+            self.by_date[task.get("date")].remove(task_id)
+            self._index_date(fields["date"], task_id)
+        task.update(fields)
+        self.version += 1
+        return task
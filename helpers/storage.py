@@ -0,0 +1,139 @@
+"""Read-through cache for the per-user files (plans, chats, timetables).
+
+Readers get the parsed contents of a file from memory as long as its
+(mtime, size) signature is unchanged, so reruns that change nothing don't
+touch the disk beyond a stat() and don't re-parse JSON. Writers go through
+write_json(), which writes atomically and refreshes the cache entry, so the
+next read is free. The cache is an LRU bounded by entry count and by the
+total size of the cached files; hit/miss/eviction counters are in stats().
+
+Cached objects are shared, so readers get a deep copy unless they pass
+copy=False and promise not to mutate the result.
+"""
+import copy as copy_module
+import hashlib
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 1024 * 1024
+
+_lock = threading.Lock()
+_entries = OrderedDict()    # path -> (signature, parser name, parsed value, sha256 of raw bytes, size)
+_total_bytes = 0
+_stats = Counter()
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _parser_name(parse):
+    # Pages redefine their parsers on every rerun, so compare by name rather than identity
+    return f"{parse.__module__}.{parse.__qualname__}"
+
+
+def _store(path, signature, parser, value, digest):
+    global _total_bytes
+    with _lock:
+        old = _entries.pop(path, None)
+        if old:
+            _total_bytes -= old[4]
+        _entries[path] = (signature, parser, value, digest, signature[1])
+        _total_bytes += signature[1]
+        while _entries and (len(_entries) > MAX_ENTRIES or _total_bytes > MAX_BYTES):
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted[4]
+            _stats["evictions"] += 1
+
+
+def _lookup(path, parse, context=""):
+    """Return the fresh cache entry for path, reading and parsing it on a miss; None if missing."""
+    path = os.path.abspath(path)
+    parser = _parser_name(parse) + context
+    signature = _signature(path)
+    if signature is None:
+        return None
+    with _lock:
+        entry = _entries.get(path)
+        if entry and entry[0] == signature and entry[1] == parser:
+            _entries.move_to_end(path)
+            _stats["hits"] += 1
+            return entry
+        _stats["misses"] += 1
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        value = parse(raw)
+    except ValueError:
+        value = None    # corrupt: callers fall back to their default
+    # Re-stat so a write racing with our read is not cached under the new signature
+    signature = _signature(path) or signature
+    entry = (signature, parser, value, hashlib.sha256(raw).hexdigest(), signature[1])
+    _store(path, *entry[:4])
+    return entry
+
+
+def read(path, parse, default=None, copy=True, context=""):
+    """Return parse(file bytes), cached; default if the file is missing or parse raises ValueError.
+
+    context is anything else the parse depends on (e.g. a key fingerprint);
+    a cached value is only reused for the same context.
+    """
+    entry = _lookup(path, parse, context)
+    if entry is None or entry[2] is None:
+        return copy_module.deepcopy(default)
+    return copy_module.deepcopy(entry[2]) if copy else entry[2]
+
+
+def read_json(path, default=None, copy=True):
+    """Return the parsed JSON in path (cached); default if missing or corrupt."""
+    return read(path, json.loads, default, copy)
+
+
+def file_digest(path):
+    """sha256 hex digest of a JSON file's bytes (of b"" if it is missing), cached with its contents."""
+    entry = _lookup(path, json.loads)
+    return entry[3] if entry else hashlib.sha256(b"").hexdigest()
+
+
+def write_json(path, data, indent=4):
+    """Atomically write data as JSON and keep the cache in step."""
+    raw = json.dumps(data, indent=indent).encode()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, path)
+    signature = _signature(path)
+    if signature:
+        _store(os.path.abspath(path), signature, _parser_name(json.loads), copy_module.deepcopy(data),
+               hashlib.sha256(raw).hexdigest())
+
+
+def invalidate(path):
+    """Forget a cached file (e.g. after deleting it or appending to it)."""
+    global _total_bytes
+    with _lock:
+        entry = _entries.pop(os.path.abspath(path), None)
+        if entry:
+            _total_bytes -= entry[4]
+
+
+def stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,125 @@
+"""SQLite-backed user store.
+
+Replaces the whole-file users.json reads and rewrites: lookups are a
+primary-key query and sign-ups are a single atomic INSERT, so two concurrent
+sign-ups can no longer overwrite each other. An existing users.json is
+imported once the first time the database is opened. The database also holds
+each user's wrapped Document Locker key (see helpers/locker_keys.py).
+"""
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+USERS_DB = APP_DIR / "users.db"
+LEGACY_USERS_FILE = APP_DIR / "users.json"
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+@contextmanager
+def _connect():
+    """Open a connection, commit on success, roll back on error and always close."""
+    conn = sqlite3.connect(USERS_DB, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _migrate_legacy_users(conn):
+    """Copy users.json into the database (runs once, recorded in the meta table)."""
+    done = conn.execute("SELECT value FROM meta WHERE key = 'users_json_migrated'").fetchone()
+    if done:
+        return
+    users = {}
+    if LEGACY_USERS_FILE.exists():
+        try:
+            with LEGACY_USERS_FILE.open("r") as f:
+                users = json.load(f)
+        except json.JSONDecodeError:
+            logger.warning("users.json is corrupted; skipping migration.")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (username, password_hash, mobile_number) VALUES (?, ?, ?)",
+        [(name, record.get("password_hash", ""), record.get("mobile_number", ""))
+         for name, record in users.items()],
+    )
+    conn.execute("INSERT INTO meta (key, value) VALUES ('users_json_migrated', '1')")
+    logger.info("Migrated %d users from users.json", len(users))
+
+
+def _init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS users (
+                                username TEXT PRIMARY KEY,
+                                password_hash TEXT NOT NULL,
+                                mobile_number TEXT NOT NULL DEFAULT '')""")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS locker_keys (
+                                username TEXT PRIMARY KEY,
+                                salt BLOB NOT NULL,
+                                iterations INTEGER NOT NULL,
+                                wrapped_key BLOB NOT NULL)""")
+            _migrate_legacy_users(conn)
+        _initialized = True
+
+
+def get_user(username):
+    """Return the user's record as a dict, or None if the username is unknown."""
+    _init_db()
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+    return dict(row) if row else None
+
+
+def add_user(username, password_hash, mobile_number=""):
+    """Insert a new user. Returns False if the username is already taken."""
+    _init_db()
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO users (username, password_hash, mobile_number) VALUES (?, ?, ?)",
+                (username, password_hash, mobile_number),
+            )
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def check_password(username, password_hash):
+    """Return True if the user exists and the stored hash matches."""
+    user = get_user(username)
+    return user is not None and user["password_hash"] == password_hash
+
+
+def get_locker_key(username):
+    """Return the user's wrapped locker key record (salt, iterations, wrapped_key), or None."""
+    _init_db()
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM locker_keys WHERE username = ?", (username,)).fetchone()
+    return dict(row) if row else None
+
+
+def save_locker_key(username, salt, iterations, wrapped_key, replace=True):
+    """Store the wrapped locker key. With replace=False, returns False if one already exists."""
+    _init_db()
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    with _connect() as conn:
+        cursor = conn.execute(
+            f"{verb} INTO locker_keys (username, salt, iterations, wrapped_key) VALUES (?, ?, ?, ?)",
+            (username, salt, iterations, wrapped_key),
+        )
+    return cursor.rowcount == 1
@@ -1,42 +1,25 @@
 import streamlit as st
 import datetime
 import json
-import time
-import base64
-from io import StringIO
 import os
-import io
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-import google.generativeai as genai
-from PIL import Image
-import pandas as pd
-import plotly.express as px
-from streamlit_calendar import calendar
-
-# --- Gemini AI Config ---
-try:
-    genai.configure(api_key=st.secrets.get("GEMINI_API_KEY", None))
-    model = genai.GenerativeModel("gemini-1.5-flash-latest")
-except Exception as e:
-    st.sidebar.error(f"Gemini setup failed: {e}")
-    model = None
+from helpers import (answer_cache, assets, calendar_client, calendar_sync, chat_sessions, context_window,
+                     llm, plan_store, storage)
+from helpers.chat_stream import stream_reply
+
+# Heavy libraries (Gemini, Google API client, pandas, plotly, streamlit_calendar) are imported
+# where they are first needed, so logged-out visits and planner-only use don't pay for them.
+# benchmarks/import_time.py reports the import cost of every page.
 
 # =================================================================================================
 # HELPER FUNCTIONS
 # =================================================================================================
-import base64
-import streamlit as st
-
 def add_bg_from_local(image_file):
-    with open(image_file, "rb") as f:
-        data = f.read()
-    encoded = base64.b64encode(data).decode()
+    image_url = assets.asset_url(image_file)
     st.markdown(
         f"""
         <style>
         .stApp {{
-            background: url("data:image/png;base64,{encoded}");
+            background: url("{image_url}");
             background-size: contain;
             background-repeat: repeat;
             background-attachment: fixed;
@@ -53,56 +36,30 @@ def save_timetable(username, data):
     user_timetables_dir = os.path.join("user_timetables")
     if not os.path.exists(user_timetables_dir):
         os.makedirs(user_timetables_dir)
-    file_path = os.path.join(user_timetables_dir, f"{username}.json")
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+    storage.write_json(os.path.join(user_timetables_dir, f"{username}.json"), data)
+
+def parse_timetable(raw):
+    """(date, DataFrame) of a saved timetable file, cached by helpers/storage.py."""
+    import pandas as pd
+    data = json.loads(raw)
+    return data.get("date"), pd.read_json(data["timetable_json"], orient='split')
 
 def load_timetable(username):
+    import pandas as pd
     user_timetables_dir = os.path.join("user_timetables")
     file_path = os.path.join(user_timetables_dir, f"{username}.json")
     today_str = str(datetime.date.today())
+    saved = storage.read(file_path, parse_timetable)
+    if saved and saved[0] == today_str:
+        return saved[1]
     time_slots = [f"{h:02d}:00" for h in range(0, 24)]
     fresh_timetable = pd.DataFrame(columns=["Activity"], index=time_slots)
     fresh_timetable["Activity"] = ""
-    if not os.path.exists(file_path):
-        return fresh_timetable
-    try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
-            if data.get("date") == today_str:
-                return pd.read_json(data["timetable_json"], orient='split')
-            else:
-                return fresh_timetable
-    except (FileNotFoundError, json.JSONDecodeError):
-        return fresh_timetable
-
-def save_plan(username, plan_data):
-    user_plans_dir = os.path.join("user_plans")
-    if not os.path.exists(user_plans_dir):
-        os.makedirs(user_plans_dir)
-    with open(os.path.join(user_plans_dir, f"{username}.json"), "w") as f:
-        json.dump(plan_data, f, indent=4)
-
-def load_plan(username):
-    user_plans_dir = os.path.join("user_plans")
-    user_plan_file = os.path.join(user_plans_dir, f"{username}.json")
-    if not os.path.exists(user_plan_file):
-        return []
-    try:
-        with open(user_plan_file, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def get_base64_of_bin_file(bin_file):
-    try:
-        with open(bin_file, 'rb') as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        return None
+    return fresh_timetable
 
 def create_priority_chart(priority_level, plan, theme_colors):
+    import pandas as pd
+    import plotly.express as px
     tasks = [t for t in plan if t.get('priority') == priority_level]
     if not tasks:
         return None
@@ -128,22 +85,62 @@ def get_user_chat_dir(username):
 
 def save_chat_history(username, chat_history, filename):
     user_chat_dir = get_user_chat_dir(username)
-    with open(os.path.join(user_chat_dir, filename), "w") as f:
-        json.dump(chat_history, f, indent=4)
+    storage.write_json(os.path.join(user_chat_dir, filename), chat_history)
 
 def load_chat_history(username, filename):
     user_chat_dir = get_user_chat_dir(username)
-    try:
-        with open(os.path.join(user_chat_dir, filename), "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return storage.read_json(os.path.join(user_chat_dir, filename), [])
 
 def delete_chat_history(username, filename):
     user_chat_dir = get_user_chat_dir(username)
     file_path = os.path.join(user_chat_dir, filename)
     if os.path.exists(file_path):
         os.remove(file_path)
+    storage.invalidate(file_path)
+
+def get_model():
+    """The shared assistant model (helpers/llm.py); None (after showing why) if Gemini can't be set up."""
+    try:
+        return llm.get_model("assistant")
+    except Exception as e:
+        st.sidebar.error(f"Gemini setup failed: {e}")
+        return None
+
+CALENDAR_MARGIN_DAYS = 7
+
+CALENDAR_GRID_DAYS = 42         # dayGridMonth always shows six weeks
+
+def shift_month(month, months):
+    """The first of the month `months` after (or before) the given first of a month."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def calendar_range(month):
+    """The days the month view shows for a month: six weeks from the Sunday on or before the 1st."""
+    start = month - datetime.timedelta(days=(month.weekday() + 1) % 7)
+    return str(start), str(start + datetime.timedelta(days=CALENDAR_GRID_DAYS))
+
+def get_calendar_events(plan_index, visible_start, visible_end):
+    """Events for the visible range plus a margin, memoized per plan version and range."""
+    margin = datetime.timedelta(days=CALENDAR_MARGIN_DAYS)
+    start = str(datetime.date.fromisoformat(visible_start) - margin)
+    end = str(datetime.date.fromisoformat(visible_end) + margin)
+    memo_key = (plan_index.version, start, end)
+    memo = st.session_state.get("calendar_events_memo")
+    if memo and memo[0] == memo_key:
+        return memo[1]
+    events = [
+        {
+            "id": task["id"],
+            "title": task.get("subject"),
+            "start": task.get("date"),
+            # Determine color based on completion
+            "color": "green" if task.get("done", False) else "red",
+        }
+        for task in plan_index.in_range(start, end)
+    ]
+    st.session_state.calendar_events_memo = (memo_key, events)
+    return events
 
 # =================================================================================================
 # COLOR THEME LOGIC
@@ -215,23 +212,33 @@ if not st.session_state.get("logged_in", False):
 username = st.session_state.get("username", "default_user").strip()
 
 # --- Google Calendar Config ---
-service = None
-try:
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-    # This line now reads the credentials from Streamlit's secrets manager
-    creds = service_account.Credentials.from_service_account_info(
-        st.secrets["google_credentials"], scopes=SCOPES
-    )
-
-    service = build('calendar', 'v3', credentials=creds)
-    st.sidebar.success("Connected to Google Calendar.")
-except Exception:
+# The client is built once per process (helpers/calendar_client.py) and only when first used
+calendar_enabled = calendar_client.configured()
+if calendar_enabled:
+    st.sidebar.success("Google Calendar sync is on.")
+    calendar_sync.start_worker(calendar_client.get_calendar_service)
+    outbox = calendar_sync.outbox_status(username)
+    if outbox["pending"] or outbox["failed"]:
+        st.sidebar.caption(f"Calendar sync: {outbox['pending']} pending, {outbox['failed']} failed")
+    if st.sidebar.button("🔄 Sync all my tasks to Calendar"):
+        try:
+            service = calendar_client.get_calendar_service()
+            if service is None:
+                raise RuntimeError("the Calendar client could not be built (see the server log)")
+            queued = calendar_sync.reconcile_user(service, username, st.session_state.get("plan"))
+            st.sidebar.success(f"Queued {queued['insert']} new, {queued['update']} changed "
+                               f"and {queued['delete']} removed events.")
+            if queued["skipped"]:
+                st.sidebar.warning(f"{queued['skipped']} task(s) without a date or times were not synced.")
+        except Exception as e:
+            st.sidebar.error(f"Calendar sync failed. Error: {e}")
+else:
     st.sidebar.error("Google Calendar not configured for deployment.")
 
 # --- SESSION STATE INITIALIZATION ---
 if "plan" not in st.session_state:
-    st.session_state.plan = load_plan(username)
+    st.session_state.plan = plan_store.load_plan(username)
+    st.session_state.plan_index = plan_store.PlanIndex(st.session_state.plan)
 if 'active_chat' not in st.session_state:
     st.session_state.active_chat = None
 if 'chat_history' not in st.session_state:
@@ -263,6 +270,8 @@ try:
         with col2:
             if st.button("🗑️", key=f"delete_{chat_file}", help=f"Delete chat {display_name}"):
                 delete_chat_history(username, chat_file)
+                chat_sessions.evict(username, chat_file)
+                context_window.delete_summary(username, chat_file)
                 if st.session_state.active_chat == chat_file:
                     st.session_state.active_chat = None
                     st.session_state.chat_history = []
@@ -326,48 +335,38 @@ with planner_tab:
                 "end": str(end_time),
                 "done": False
             }
+            plan_store.add_task(username, new_task)
             st.session_state.plan.append(new_task)
-            save_plan(username, st.session_state.plan)
-
-            # Google Calendar
-            if service:
-                start_time_str = start_time.strftime("%H:%M:%S")
-                end_time_str = end_time.strftime("%H:%M:%S")
-                event = {
-                    'summary': f'[{priority}] Study: {subject}',
-                    'start': {'dateTime': f'{task_date}T{start_time_str}', 'timeZone': 'Asia/Kolkata'},
-                    'end': {'dateTime': f'{task_date}T{end_time_str}', 'timeZone': 'Asia/Kolkata'},
-                    'reminders': {'useDefault': False, 'overrides': [{'method': 'popup', 'minutes': 10}]}
-                }
-                try:
-                    service.events().insert(calendarId='primary', body=event).execute()
-                    st.success(f"✅ Synced '{subject}' with Google Calendar.")
-                except Exception as e:
-                    st.error(f"Failed to add to Google Calendar. Error: {e}")
+            st.session_state.plan_index.add(new_task)
+
+            # Google Calendar (sent in the background by the outbox worker)
+            if calendar_enabled:
+                calendar_sync.enqueue_task(username, new_task)
+                st.success(f"✅ '{subject}' queued for Google Calendar sync.")
 
             st.success(f"Task '{subject}' added!")
 
         st.divider()
-        tasks_to_display = [
-            t for t in st.session_state.plan
-            if t.get('date') == (st.session_state.selected_date or str(datetime.date.today()))
-        ]
+        tasks_to_display = st.session_state.plan_index.for_date(
+            st.session_state.selected_date or str(datetime.date.today())
+        )
         st.subheader(f"📌 Today's Plan ({str(datetime.date.today())})")
         if not tasks_to_display:
             st.info("No tasks scheduled for this day.")
         else:
             for task in tasks_to_display:
-                original_index = next((idx for idx, t in enumerate(st.session_state.plan) if t == task), None)
-                if original_index is not None:
-                    is_done = st.checkbox(
-                        f"**{task['subject']}** ({task['priority']})",
-                        key=f"task_{original_index}",
-                        value=task.get('done', False)
-                    )
-                    if is_done != st.session_state.plan[original_index].get('done', False):
-                        st.session_state.plan[original_index]['done'] = is_done
-                        save_plan(username, st.session_state.plan)
-                        st.rerun()
+                is_done = st.checkbox(
+                    f"**{task['subject']}** ({task['priority']})",
+                    key=f"task_{task['id']}",
+                    value=task.get('done', False)
+                )
+                if is_done != task.get('done', False):
+                    previous = dict(task)
+                    st.session_state.plan_index.update(task['id'], done=is_done)
+                    plan_store.update_task(username, task['id'], previous=previous, done=is_done)
+                    if calendar_enabled:
+                        calendar_sync.enqueue_task_update(username, task)
+                    st.rerun()
 
         # Overall Progress
         if st.session_state.plan:
@@ -393,23 +392,39 @@ with planner_tab:
     # RIGHT COLUMN
     # RIGHT COLUMN
 with col_right:
+    from streamlit_calendar import calendar
     st.header("📅 Your Calendar")
-    calendar_events = []
-    for idx, task in enumerate(st.session_state.plan):
-        # Determine color based on completion
-        color = "green" if task.get("done", False) else "red"
-        # Add task to calendar, only title (no start/end times)
-        calendar_events.append({
-            "id": str(idx),
-            "title": task.get("subject"),
-            "start": task.get("date"),
-            "color": color
-        })
-
-    clicked_event = calendar(events=calendar_events, key=f"calendar_{len(calendar_events)}")
+    # The component doesn't report navigation, so the month is chosen here and the
+    # calendar's own prev/next buttons are hidden; only that month's events are sent
+    if "calendar_month" not in st.session_state:
+        st.session_state.calendar_month = datetime.date.today().replace(day=1)
+    col_prev, col_today, col_next, col_month = st.columns([1, 2, 1, 4])
+    if col_prev.button("◀", key="calendar_prev", help="Previous month"):
+        st.session_state.calendar_month = shift_month(st.session_state.calendar_month, -1)
+    if col_today.button("Today", key="calendar_today"):
+        st.session_state.calendar_month = datetime.date.today().replace(day=1)
+    if col_next.button("▶", key="calendar_next", help="Next month"):
+        st.session_state.calendar_month = shift_month(st.session_state.calendar_month, 1)
+    calendar_month = st.session_state.calendar_month
+    col_month.subheader(calendar_month.strftime("%B %Y"))
+    calendar_events = get_calendar_events(st.session_state.plan_index, *calendar_range(calendar_month))
+
+    calendar_options = {
+        "initialView": "dayGridMonth",
+        "initialDate": str(calendar_month),
+        "headerToolbar": False,
+    }
+    # A key that only changes with the month lets the component update its events in place
+    # instead of remounting when a task is added
+    calendar_state = calendar(events=calendar_events, options=calendar_options, callbacks=["eventClick"],
+                              key=f"planner_calendar_{calendar_month:%Y-%m}")
+    clicked_event = (calendar_state or {}).get("eventClick", calendar_state)
     if clicked_event and "event" in clicked_event:
-        event_id = int(clicked_event["event"]["id"])
-        task = st.session_state.plan[event_id]
+        event_id = clicked_event["event"]["id"]
+        task = st.session_state.plan_index.get(event_id)
+    else:
+        task = None
+    if task:
         # Checkbox to toggle completion
         is_done = st.sidebar.checkbox(
             f"{task['subject']} ({task['date']})",
@@ -417,8 +432,11 @@ with col_right:
             key=f"calendar_task_{event_id}"
         )
         if is_done != task.get("done", False):
-            st.session_state.plan[event_id]["done"] = is_done
-            save_plan(username, st.session_state.plan)
+            previous = dict(task)
+            st.session_state.plan_index.update(event_id, done=is_done)
+            plan_store.update_task(username, event_id, previous=previous, done=is_done)
+            if calendar_enabled:
+                calendar_sync.enqueue_task_update(username, task)
             st.rerun()
 
 
@@ -427,20 +445,37 @@ with assistant_tab:
     st.header("Your Doubt-Solving Bestie!")
     if st.session_state.active_chat:
         st.caption(f"Continuing chat: `{st.session_state.active_chat.replace('.json', '')}`")
+        st.toggle("⚡ Reuse answers to common questions", key="use_answer_cache",
+                  help="Answer a new chat's first question from previously given answers when one matches.")
+        if st.session_state.get("use_answer_cache", False):
+            cache_stats = answer_cache.stats()
+            st.caption(f"Answer cache: {cache_stats['entries']} answers, {cache_stats['hit_rate']:.0%} hit rate")
         for message in st.session_state.chat_history:
             with st.chat_message(message["role"]):
                 st.markdown(message["parts"])
-        if model and (user_prompt := st.chat_input("What can I help you with?")):
-            st.session_state.chat_history.append({"role": "user", "parts": user_prompt})
-            with st.chat_message("user"):
-                st.markdown(user_prompt)
-            with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    chat = model.start_chat(history=st.session_state.chat_history)
-                    response = chat.send_message(user_prompt)
-                    st.markdown(response.text)
-            st.session_state.chat_history.append({"role": "assistant", "parts": response.text})
-            save_chat_history(username, st.session_state.chat_history, st.session_state.active_chat)
+        if user_prompt := st.chat_input("What can I help you with?"):
+            saved_turns = len(st.session_state.chat_history)
+            # Only a chat's first question is context-free enough to answer from the cache
+            cacheable = st.session_state.get("use_answer_cache", False) and saved_turns == 0
+            cached_answer = answer_cache.lookup(user_prompt) if cacheable else None
+            model = None if cached_answer else get_model()
+            if cached_answer or model:
+                st.session_state.chat_history.append({"role": "user", "parts": user_prompt})
+                with st.chat_message("user"):
+                    st.markdown(user_prompt)
+                with st.chat_message("assistant"):
+                    if cached_answer:
+                        response_text = cached_answer
+                        st.markdown(response_text)
+                        st.caption("⚡ Answered instantly from the shared answer cache.")
+                    else:
+                        chat = chat_sessions.get_session(model, username, st.session_state.active_chat, saved_turns,
+                                                         persona="assistant")
+                        response_text, _ = stream_reply(chat, user_prompt)
+                        if cacheable:
+                            answer_cache.store(user_prompt, response_text)
+                st.session_state.chat_history.append({"role": "assistant", "parts": response_text})
+                save_chat_history(username, st.session_state.chat_history, st.session_state.active_chat)
     else:
         st.info("To talk to the AI, start a '➕ New Chat' from the sidebar.")
 
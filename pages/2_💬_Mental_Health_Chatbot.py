@@ -1,9 +1,8 @@
 import streamlit as st
 import time
-import json
 import os
-import google.generativeai as genai
-import base64
+from helpers import assets, chat_sessions, llm, storage
+from helpers.chat_stream import stream_reply
 
 # =================================================================================================
 # PAGE CONFIGURATION
@@ -21,18 +20,11 @@ def get_user_chat_dir(username):
 
 def save_chat_history(username, chat_history):
     user_chat_dir = get_user_chat_dir(username)
-    file_path = os.path.join(user_chat_dir, "mental_health_chat.json")
-    with open(file_path, "w") as f:
-        json.dump(chat_history, f, indent=4)
+    storage.write_json(os.path.join(user_chat_dir, "mental_health_chat.json"), chat_history)
 
 def load_chat_history(username):
     user_chat_dir = get_user_chat_dir(username)
-    file_path = os.path.join(user_chat_dir, "mental_health_chat.json")
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return storage.read_json(os.path.join(user_chat_dir, "mental_health_chat.json"), [])
 
 # =================================================================================================
 # COLOR THEME LOGIC
@@ -49,15 +41,12 @@ COLOR_THEMES = {
 }
 
 def set_chat_background(image_path):
-    try:
-        with open(image_path, "rb") as f:
-            data = f.read()
-        encoded = base64.b64encode(data).decode()
-
+    image_url = assets.asset_url(image_path)
+    if image_url:
         css = f"""
         <style>
             .stApp {{
-                background: url("data:image/png;base64,{encoded}") repeat center center fixed;
+                background: url("{image_url}") repeat center center fixed;
                 background-size: contain;
             }}
             .stChatMessage, .st-emotion-cache-16txtl3 {{
@@ -68,7 +57,7 @@ def set_chat_background(image_path):
         </style>
         """
         st.markdown(css, unsafe_allow_html=True)
-    except FileNotFoundError:
+    else:
         st.warning(f"Background image '{image_path}' not found. Please check the file path.")
 
 def apply_color_theme(theme_colors):
@@ -158,26 +147,13 @@ if not st.session_state.get("logged_in", False):
 username = st.session_state.get("username", "default_user").strip()
 
 # --- Gemini API Configuration ---
-model = None
+# Pebble's persona (system instruction) and generation settings live in helpers/llm.py
 try:
-    genai.configure(api_key=st.secrets.get("GEMINI_API_KEY", None))
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
+    model = llm.get_model("pebble")
 except Exception:
     st.error("Gemini API not configured. This feature is currently disabled.")
     st.stop()
 
-# --- CHATBOT PERSONA ---
-SYSTEM_PROMPT = """
-You are a friendly, empathetic, and supportive AI companion for students. Your name is 'Pebble'.
-Your purpose is to be a safe space for students to talk about their study-related stress, anxieties, and mental health challenges.
-- Listen carefully and validate their feelings.
-- Offer gentle, constructive advice and coping strategies (like the Pomodoro Technique, mindfulness exercises, or breaking down large tasks).
-- Always be encouraging and positive.
-- NEVER claim to be a real therapist or a replacement for professional help.
-- If the user's problem seems serious or they mention severe distress, you MUST include the following disclaimer in your response: 
-"I'm here to listen, but I'm an AI. If you're feeling overwhelmed, please consider talking to a trusted adult or a mental health professional. You are not alone."
-"""
-
 # --- Load history ---
 if "mh_chat_history" not in st.session_state:
     st.session_state.mh_chat_history = load_chat_history(username)
@@ -206,17 +182,15 @@ with col_left:
 
     # User input
     if user_prompt := st.chat_input("Share your thoughts here..."):
+        chat = chat_sessions.get_session(
+            model, username, "mental_health_chat.json", len(st.session_state.mh_chat_history), persona="pebble"
+        )
         st.session_state.mh_chat_history.append({"role": "user", "parts": user_prompt})
         with st.chat_message("user", avatar="😊"):
             st.markdown(user_prompt)
 
         with st.chat_message("assistant", avatar="🌱"):
-            with st.spinner("Pebble is thinking..."):
-                full_history = [{"role": "user", "parts": SYSTEM_PROMPT}] + st.session_state.mh_chat_history
-                chat = model.start_chat(history=full_history)
-                response = chat.send_message(user_prompt)
-                response_text = response.text
-                st.markdown(response_text)
+            response_text, _ = stream_reply(chat, user_prompt)
 
         st.session_state.mh_chat_history.append({"role": "assistant", "parts": response_text})
         save_chat_history(username, st.session_state.mh_chat_history)
@@ -1,13 +1,7 @@
 import streamlit as st
-import os
 import time
-import json
-import base64
 import hashlib
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
+from helpers import assets, locker_keys, locker_store, user_store
 
 # =================================================================================================
 # PAGE CONFIGURATION
@@ -17,54 +11,28 @@ st.set_page_config(page_title="Secure Document Locker", page_icon="🔒", layout
 # =================================================================================================
 # HELPER FUNCTIONS
 # =================================================================================================
-def get_base64_of_bin_file(bin_file):
-    """ Reads a local file and returns its Base64 encoded string. """
-    try:
-        with open(bin_file, 'rb') as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        return None
-
-def load_users():
-    """Loads the user database from the main users.json file."""
-    try:
-        with open("users.json", "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        st.error("users.json not found or is corrupted.")
-        return {}
-
 def hash_password(password):
     """Returns the sha256 hash of a password."""
     return hashlib.sha256(password.encode()).hexdigest()
 
-SALT = b'your_project_specific_salt_for_this_prototype'
+DOCUMENTS_PER_PAGE = 20
 
-def get_key_from_password(password, salt):
-    """Derives a secure encryption key from a user's password."""
-    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=480000, backend=default_backend())
-    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-    return key
-
-def get_user_doc_dir(username):
-    """Returns the path to the user's specific document directory."""
-    user_doc_dir = os.path.join("user_documents", username.strip())
-    if not os.path.exists(user_doc_dir):
-        os.makedirs(user_doc_dir)
-    return user_doc_dir
+def describe_document(entry):
+    """One-line size / upload date / type summary of a manifest entry."""
+    uploaded = time.strftime("%d %b %Y", time.localtime(entry["uploaded"])) if entry.get("uploaded") else "unknown date"
+    return f"{entry['size'] / 1e6:.2f} MB · {uploaded} · {entry.get('content_type', '')}"
 
 # =================================================================================================
 # STYLING
 # =================================================================================================
 # --- This new section adds your custom background image ---
-bg_image_base64 = get_base64_of_bin_file("lock.jpg")
-if bg_image_base64:
+bg_image_url = assets.asset_url("lock.jpg")
+if bg_image_url:
     st.markdown(f"""
     <style>
 
         .stApp {{
-            background-image: linear-gradient(rgba(0, 4, 40, 0.7), rgba(0, 4, 40, 0.7)), url("data:image/jpeg;base64,{bg_image_base64}");
+            background-image: linear-gradient(rgba(0, 4, 40, 0.7), rgba(0, 4, 40, 0.7)), url("{bg_image_url}");
             background-size: contain;
             background-attachment: fixed;
         }}
@@ -97,6 +65,8 @@ if 'locker_unlocked' not in st.session_state:
     st.session_state.locker_unlocked = False
 if 'fernet_key' not in st.session_state:
     st.session_state.fernet_key = None
+if 'locker_key' not in st.session_state:
+    st.session_state.locker_key = None
 
 # --- LOCK SCREEN VIEW ---
 if not st.session_state.locker_unlocked:
@@ -105,14 +75,24 @@ if not st.session_state.locker_unlocked:
     
     if st.button("Unlock Locker"):
       if locker_password:
-            users = load_users()
             # --- THIS IS THE SECURITY FIX ---
             # Verify the user's main login password before unlocking
-            if username in users and users[username]['password_hash'] == hash_password(locker_password):
-                # If correct, generate the encryption key from that same password
-                key = get_key_from_password(locker_password, SALT)
-                st.session_state.fernet_key = Fernet(key)
+            if user_store.check_password(username, hash_password(locker_password)):
+                # If correct, unwrap the locker's data key with that same password
+                try:
+                    data_key = locker_keys.unlock(username, locker_password,
+                                                  has_documents=locker_store.has_documents(username))
+                except locker_keys.LockerKeyError:
+                    st.error("This password does not open your locker key. Was your password changed?")
+                    st.stop()
+                st.session_state.locker_key = data_key
+                st.session_state.fernet_key = locker_keys.fernet_for(data_key)   # legacy single-token files
                 st.session_state.locker_unlocked = True
+                try:
+                    # Sweep blobs orphaned by uploads that were interrupted before their manifest was saved
+                    locker_store.collect_garbage(username, data_key)
+                except locker_store.ManifestUnreadable:
+                    pass    # reported by the listing below
                 st.success("Locker Unlocked!")
                 time.sleep(1)
                 st.rerun()
@@ -127,6 +107,7 @@ else:
         # Reset locker state
         st.session_state.locker_unlocked = False
         st.session_state.fernet_key = None
+        st.session_state.locker_key = None
 
         # Show lock symbol
         st.markdown(
@@ -151,54 +132,120 @@ else:
 
     
     # --- File Uploader ---
-    st.subheader("Upload a New Document")
-    uploaded_file = st.file_uploader("Choose a file to encrypt and upload", type=None, key="doc_uploader")
-    if uploaded_file is not None:
-        file_bytes = uploaded_file.getvalue()
-        encrypted_data = st.session_state.fernet_key.encrypt(file_bytes)
-        user_doc_dir = get_user_doc_dir(username)
-        file_path = os.path.join(user_doc_dir, uploaded_file.name + ".encrypted")
-        with open(file_path, "wb") as f:
-            f.write(encrypted_data)
-        st.success(f"✅ Successfully encrypted and saved '{uploaded_file.name}'!")
+    st.subheader("Upload New Documents")
+    uploaded_files = st.file_uploader("Choose files to encrypt and upload", type=None, key="doc_uploader",
+                                      accept_multiple_files=True)
+    if 'processed_uploads' not in st.session_state:
+        st.session_state.processed_uploads = set()
+    # The uploader returns the same files on every rerun; store each upload only once
+    new_files = [f for f in uploaded_files or [] if f.file_id not in st.session_state.processed_uploads]
+    if new_files:
+        progress_bars = [st.progress(0.0, text=f"Encrypting '{f.name}'...") for f in new_files]
+
+        def show_progress(fractions):
+            for bar, file, fraction in zip(progress_bars, new_files, fractions):
+                bar.progress(fraction, text=f"Encrypting '{file.name}'... {fraction:.0%}")
+
+        # Identical content is stored once; new content is compressed if it helps and encrypted chunk by chunk,
+        # several files at a time
+        batch_start = time.perf_counter()
+        results = locker_store.put_many(username, st.session_state.locker_key,
+                                        [(f.name, f, f.type) for f in new_files], on_progress=show_progress)
+        batch_seconds = time.perf_counter() - batch_start
+        for bar in progress_bars:
+            bar.empty()
+
+        stored_bytes, failed = 0, []
+        for uploaded_file, result in zip(new_files, results):
+            if isinstance(result, Exception):
+                failed.append(uploaded_file.name)
+                st.error(f"❌ Could not save '{uploaded_file.name}': {result}")
+                continue
+            # Failed files stay unprocessed, so they are retried on the next rerun
+            st.session_state.processed_uploads.add(uploaded_file.file_id)
+            if result["deduplicated"]:
+                st.success(f"✅ Saved '{uploaded_file.name}' (same content is already in your locker, so nothing new was stored).")
+            else:
+                stored_bytes += result["size"]
+                st.success(f"✅ Successfully encrypted and saved '{uploaded_file.name}'! "
+                           f"({result['size'] / 1e6:.1f} MB at {result['mb_per_s']:.1f} MB/s)")
+        if len(new_files) > 1:
+            rate = stored_bytes / 1e6 / batch_seconds if batch_seconds else 0.0
+            summary = (f"{len(new_files) - len(failed)} of {len(new_files)} files saved "
+                       f"({stored_bytes / 1e6:.1f} MB encrypted at {rate:.1f} MB/s overall)")
+            if failed:
+                st.warning(f"{summary}. Failed: {', '.join(failed)}")
+            else:
+                st.info(summary)
 
     st.markdown("---")
 
     # --- Display and Download Encrypted Files (with new password check) ---
     st.subheader("Your Secured Documents")
-    user_doc_dir = get_user_doc_dir(username)
     try:
-        encrypted_files = [f for f in os.listdir(user_doc_dir) if f.endswith(".encrypted")]
-        if not encrypted_files:
-            st.info("Your locker is empty. Upload a document to see it here.")
+        locker_key = st.session_state.locker_key
+        name_filter = st.text_input("🔎 Filter by name", key="doc_filter")
+        # Only the current page is rendered; the listing comes from the encrypted manifest
+        if "doc_page" not in st.session_state:
+            st.session_state.doc_page = 1
+        page_number = st.session_state.doc_page
+        documents, total_documents = locker_store.list_documents(username, locker_key, name_filter,
+                                                                 offset=(page_number - 1) * DOCUMENTS_PER_PAGE,
+                                                                 limit=DOCUMENTS_PER_PAGE)
+        page_count = max(1, -(-total_documents // DOCUMENTS_PER_PAGE))
+        if page_number > page_count:
+            # The filter or a delete shrank the listing
+            st.session_state.doc_page = page_number = page_count
+            documents, _ = locker_store.list_documents(username, locker_key, name_filter,
+                                                       offset=(page_number - 1) * DOCUMENTS_PER_PAGE,
+                                                       limit=DOCUMENTS_PER_PAGE)
+        if page_count > 1:
+            st.number_input("Page", min_value=1, max_value=page_count, step=1, key="doc_page")
+        if not documents:
+            if name_filter:
+                st.info("No documents match that name.")
+            else:
+                st.info("Your locker is empty. Upload a document to see it here.")
         else:
-            for encrypted_file in encrypted_files:
-                display_name = encrypted_file.replace(".encrypted", "")
-                
+            logical, physical = locker_store.usage(username, locker_key)
+            saved = 1 - physical / logical if logical else 0
+            st.caption(f"{total_documents} document(s) · page {page_number} of {page_count} · "
+                       f"{logical / 1e6:.1f} MB of documents stored in {physical / 1e6:.1f} MB "
+                       f"({saved:.0%} saved by compression and de-duplication)")
+            for display_name, entry in documents:
+                col_download, col_info, col_delete = st.columns([4, 3, 1])
+                col_info.caption(describe_document(entry))
+
                 # Use st.popover for the password confirmation
-                with st.popover(f"Download '{display_name}'"):
+                with col_download.popover(f"Download '{display_name}'"):
                     st.write(f"Please confirm your main login password to download this file.")
-                    with st.form(f"form_{encrypted_file}"):
+                    with st.form(f"form_{display_name}"):
                         locker_password = st.text_input("Your Login Password", type="password")
                         submitted = st.form_submit_button("Confirm & Prepare Download")
 
                         if submitted:
-                            users = load_users()
                             # Verify the user's main login password
-                            if username in users and users[username]['password_hash'] == hash_password(locker_password):
+                            if user_store.check_password(username, hash_password(locker_password)):
                                 # If correct, decrypt the file and show the real download button
-                                with open(os.path.join(user_doc_dir, encrypted_file), "rb") as f:
-                                    encrypted_data_to_download = f.read()
-                                decrypted_data = st.session_state.fernet_key.decrypt(encrypted_data_to_download)
-                                
-                                st.success("Password correct!")
-                                st.download_button(
-                                    label="Click here to Download",
-                                    data=decrypted_data,
-                                    file_name=display_name
-                                )
+                                # Decrypt chunk by chunk into a spooled temp file. download_button doesn't
+                                # accept that type and keeps the whole file in memory anyway, so Streamlit
+                                # still holds one full plaintext copy of the document.
+                                with locker_store.open_document(
+                                    username, locker_key, display_name,
+                                    legacy_fernet=st.session_state.fernet_key,
+                                ) as decrypted_file:
+                                    st.success("Password correct!")
+                                    st.download_button(
+                                        label="Click here to Download",
+                                        data=decrypted_file.read(),
+                                        file_name=display_name
+                                    )
                             else:
                                 st.error("Incorrect password.")
 
+                if col_delete.button("🗑️", key=f"delete_{display_name}", help=f"Delete '{display_name}'"):
+                    locker_store.delete(username, locker_key, display_name)
+                    st.rerun()
+
     except Exception as e:
-        st.error(f"Could not read document directory. Error: {e}")
+        st.error(f"Could not read your documents. Error: {e}")
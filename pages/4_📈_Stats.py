@@ -3,23 +3,8 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 import datetime
-import os
-import json
-
-# =================================================================================================
-# HELPER FUNCTION to load the user's plan
-# =================================================================================================
-def load_plan(username):
-    """Loads a user's plan from their dedicated JSON file."""
-    user_plans_dir = os.path.join("user_plans")
-    user_plan_file = os.path.join(user_plans_dir, f"{username}.json")
-    if not os.path.exists(user_plan_file):
-        return []
-    try:
-        with open(user_plan_file, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+from helpers import export
+from helpers.plan_store import daily_rollup
 
 # =================================================================================================
 # STYLING (Inspired by your "Stats" image)
@@ -77,15 +62,24 @@ if not st.session_state.get("logged_in", False):
 
 username = st.session_state.get("username", "default_user").strip()
 
-# --- Load and Process Data ---
-plan = load_plan(username)
-if not plan:
+# --- Load Data ---
+# Per-day totals kept up to date by the plan store, so nothing here scales with the number of tasks
+days = daily_rollup(username)
+if not days:
     st.info("You haven't added any tasks yet. Add tasks in the 'Study Planner' to see your stats.")
     st.stop()
 
-df = pd.DataFrame(plan)
-df['date'] = pd.to_datetime(df['date'])
-df['done'] = df['done'].astype(bool)
+def totals_between(start, end):
+    """(total, done) of the tasks dated from start to end inclusive."""
+    total = done = 0
+    day = start
+    while day <= end:
+        counts = days.get(day.isoformat())
+        if counts:
+            total += counts["total"]
+            done += counts["done"]
+        day += datetime.timedelta(days=1)
+    return total, done
 
 # --- Create Tabs for Different Views ---
 today_tab, week_tab, performance_tab = st.tabs(["Today", "This Week", "Performance"])
@@ -93,13 +87,11 @@ today_tab, week_tab, performance_tab = st.tabs(["Today", "This Week", "Performan
 # --- TODAY'S STATS ---
 with today_tab:
     st.header(f"Today's Progress ({datetime.date.today().strftime('%b %d, %Y')})")
-    today_df = df[df['date'].dt.date == datetime.date.today()]
+    total_today, done_today = totals_between(datetime.date.today(), datetime.date.today())
 
-    if today_df.empty:
+    if total_today == 0:
         st.info("No tasks scheduled for today.")
     else:
-        total_today = len(today_df)
-        done_today = today_df['done'].sum()
         pending_today = total_today - done_today
         completion_percent = (done_today / total_today) * 100 if total_today > 0 else 0
 
@@ -125,13 +117,11 @@ with week_tab:
     end_of_week = start_of_week + datetime.timedelta(days=6)
     st.header(f"This Week's Progress ({start_of_week.strftime('%b %d')} - {end_of_week.strftime('%b %d')})")
     
-    week_df = df[(df['date'].dt.date >= start_of_week) & (df['date'].dt.date <= end_of_week)]
+    total_week, done_week = totals_between(start_of_week, end_of_week)
 
-    if week_df.empty:
+    if total_week == 0:
         st.info("No tasks scheduled for this week.")
     else:
-        total_week = len(week_df)
-        done_week = week_df['done'].sum()
         pending_week = total_week - done_week
         completion_percent_week = (done_week / total_week) * 100 if total_week > 0 else 0
 
@@ -152,15 +142,9 @@ with week_tab:
 # --- PERFORMANCE OVER TIME (YEAR) ---
 with performance_tab:
     st.header("Performance Over Time")
-    df_monthly = df.set_index('date').resample('ME').agg(
-        completed_tasks=('done', 'sum')
-    ).reset_index()
-    df_monthly = df.set_index('date').groupby(pd.Grouper(freq='M')).agg(
-        total_tasks=('done', 'count'),
-        completed_tasks=('done', 'sum')
-    ).reset_index()
-    df_monthly['completion_rate'] = (df_monthly['completed_tasks'] / df_monthly['total_tasks']) * 100
-    df_monthly['month'] = df_monthly['date'].dt.strftime('%Y-%m')
+    df_days = pd.DataFrame.from_dict(days, orient='index')[['total', 'done']]
+    df_monthly = df_days.groupby(df_days.index.str[:7]).sum().rename_axis('month').reset_index()
+    df_monthly['completion_rate'] = (df_monthly['done'] / df_monthly['total']) * 100
 
     if df_monthly.empty:
         st.info("Not enough data to show performance over time. Complete some tasks!")
@@ -179,3 +163,11 @@ with performance_tab:
             xaxis=dict(gridcolor='rgba(255,255,255,0.2)'), yaxis=dict(gridcolor='rgba(255,255,255,0.2)')
         )
         st.plotly_chart(fig_line, use_container_width=True)
+
+# --- EXPORT ---
+with st.expander("⬇️ Export my data"):
+    st.write("Download your plans, chats and timetable as Parquet (for pandas, DuckDB, Spark...) or NDJSON.")
+    export_format = st.radio("Format", export.FORMATS, horizontal=True, key="export_format")
+    if st.button("Prepare export"):
+        st.download_button("Download export (.zip)", data=export.export_user_archive(username, export_format),
+                           file_name=f"{username}_study_buddy_{export_format}.zip", mime="application/zip")
@@ -0,0 +1,85 @@
+import streamlit as st
+import plotly.express as px
+from helpers import analytics
+
+# =================================================================================================
+# PAGE CONFIGURATION
+# =================================================================================================
+st.set_page_config(page_title="Admin Analytics", page_icon="📊", layout="wide")
+
+# =================================================================================================
+# HELPER FUNCTIONS
+# =================================================================================================
+def is_admin(username):
+    """Staff accounts are listed under ADMIN_USERS in .streamlit/secrets.toml."""
+    try:
+        return username in st.secrets.get("ADMIN_USERS", [])
+    except Exception:
+        return False
+
+def style_chart(fig):
+    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(255,255,255,0.05)')
+    return fig
+
+# =================================================================================================
+# MAIN APP
+# =================================================================================================
+st.title("📊 Admin Analytics")
+st.write("Completion trends across all users.")
+
+if not st.session_state.get("logged_in", False):
+    st.warning("Please log in from the Home page to view analytics.")
+    st.stop()
+
+username = st.session_state.get("username", "default_user").strip()
+if not is_admin(username):
+    st.error("This page is only available to staff accounts.")
+    st.stop()
+
+# --- Load Data ---
+# Only users whose plan files changed since the last visit are re-read
+with st.spinner("Updating the analytics dataset..."):
+    df, info = analytics.refresh_dataset()
+st.caption(f"{len(df)} tasks from {info['users']} users · {info['reloaded']} reloaded in {info['seconds']:.2f}s")
+
+if df.empty:
+    st.info("No plans have been created yet.")
+    st.stop()
+
+cohort_tab, priority_tab, weekly_tab = st.tabs(["Cohorts", "Priority Mix", "Weekly Activity"])
+
+# --- COHORT COMPLETION ---
+with cohort_tab:
+    st.header("Completion Rate by Cohort")
+    st.write("Users are grouped by the month of their first task; columns are months since then.")
+    cohorts = analytics.cohort_completion(df)
+    if cohorts.empty:
+        st.info("No dated tasks yet.")
+    else:
+        fig_cohorts = px.imshow(cohorts.round(1), text_auto=True, aspect="auto", color_continuous_scale="Viridis",
+                                labels={'x': 'Months since first task', 'y': 'Cohort', 'color': 'Completion (%)'})
+        st.plotly_chart(style_chart(fig_cohorts), use_container_width=True)
+
+# --- PRIORITY MIX ---
+with priority_tab:
+    st.header("Priority Mix")
+    mix = analytics.priority_mix(df).reset_index()
+    col1, col2 = st.columns(2)
+    with col1:
+        fig_mix = px.pie(mix, values='tasks', names='priority', title='Share of Tasks', hole=.3)
+        st.plotly_chart(style_chart(fig_mix), use_container_width=True)
+    with col2:
+        fig_rate = px.bar(mix, x='priority', y='completion_rate', title='Completion Rate (%)')
+        st.plotly_chart(style_chart(fig_rate), use_container_width=True)
+
+# --- WEEKLY ACTIVITY ---
+with weekly_tab:
+    st.header("Weekly Activity")
+    weekly = analytics.weekly_activity(df).reset_index()
+    if weekly.empty:
+        st.info("No dated tasks yet.")
+    else:
+        fig_weekly = px.bar(weekly, x='week', y=['tasks', 'done'], barmode='group', title='Tasks per Week')
+        st.plotly_chart(style_chart(fig_weekly), use_container_width=True)
+        fig_users = px.line(weekly, x='week', y='active_users', markers=True, title='Active Users per Week')
+        st.plotly_chart(style_chart(fig_users), use_container_width=True)
@@ -0,0 +1,18 @@
+import pytest
+
+from helpers import calendar_sync
+from fake_calendar import FakeCalendar
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    """A fresh calendar outbox (and plan directory) in a temp dir."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(calendar_sync, "OUTBOX_DB", tmp_path / "calendar_outbox.db")
+    monkeypatch.setattr(calendar_sync, "_initialized", False)
+    return calendar_sync
+
+
+@pytest.fixture
+def calendar():
+    return FakeCalendar()
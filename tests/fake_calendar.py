@@ -0,0 +1,160 @@
+"""In-memory stand-in for the googleapiclient Calendar service used by helpers/calendar_sync.py.
+
+It supports events().insert/patch/delete/list/list_next and batch requests,
+keeps deleted events as "cancelled" like the real API, hands out sync tokens,
+and can be told to fail the next call to a method with a given HTTP status.
+"""
+import copy
+import types
+
+
+class HttpError(Exception):
+    """Shaped like googleapiclient.errors.HttpError as far as calendar_sync looks (resp.status)."""
+
+    def __init__(self, status, reason=""):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.resp = types.SimpleNamespace(status=status)
+
+
+class _Request:
+    def __init__(self, run):
+        self._run = run
+
+    def execute(self):
+        return self._run()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        self._service.batch_sizes.append(len(self._requests))
+        if self._service.batch_error is not None:
+            error, self._service.batch_error = self._service.batch_error, None
+            raise error
+        for request_id, request in self._requests:
+            try:
+                response = request.execute()
+            except HttpError as e:
+                self._callback(request_id, None, e)
+            else:
+                self._callback(request_id, response, None)
+
+
+class _Events:
+    def __init__(self, service):
+        self._service = service
+
+    def insert(self, calendarId, body):
+        return _Request(lambda: self._service._insert(body))
+
+    def patch(self, calendarId, eventId, body):
+        return _Request(lambda: self._service._patch(eventId, body))
+
+    def delete(self, calendarId, eventId):
+        return _Request(lambda: self._service._delete(eventId))
+
+    def list(self, calendarId, maxResults=250, syncToken=None, **params):
+        return _Request(lambda: self._service._list(syncToken))
+
+    def list_next(self, request, response):
+        return None     # everything fits on one page
+
+
+class FakeCalendar:
+    def __init__(self):
+        self.events_by_id = {}
+        self.batch_sizes = []
+        self.batch_error = None
+        self._failures = {}     # method -> [(status, applied)]
+        self._changes = []      # event ids in the order they changed, for sync tokens
+        self._next_random_id = 0
+
+    # --- test controls ---
+    def fail_next(self, method, status, applied=False):
+        """Make the next call to method raise status; with applied=True the change happens first
+        (a response lost on the way back)."""
+        self._failures.setdefault(method, []).append((status, applied))
+
+    def add_untracked_event(self, summary, start, end):
+        """An event created without an id or extended properties (as the planner used to)."""
+        self._next_random_id += 1
+        event_id = f"random{self._next_random_id}"
+        self._store({"id": event_id, "summary": summary, "status": "confirmed",
+                     "start": {"dateTime": start, "timeZone": "Asia/Kolkata"},
+                     "end": {"dateTime": end, "timeZone": "Asia/Kolkata"}})
+        return event_id
+
+    def live_events(self):
+        return {event_id: event for event_id, event in self.events_by_id.items() if event["status"] != "cancelled"}
+
+    # --- service API ---
+    def events(self):
+        return _Events(self)
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self, callback)
+
+    def _store(self, event):
+        self.events_by_id[event["id"]] = event
+        self._changes.append(event["id"])
+
+    def _call(self, method, apply):
+        status, applied = self._failures[method].pop(0) if self._failures.get(method) else (None, False)
+        if status is not None and not applied:
+            raise HttpError(status)
+        result = apply()
+        if status is not None:
+            raise HttpError(status, "response lost")
+        return result
+
+    def _insert(self, body):
+        def apply():
+            if body.get("id") in self.events_by_id:
+                raise HttpError(409, "duplicate")
+            event = copy.deepcopy(body)
+            if "id" not in event:
+                self._next_random_id += 1
+                event["id"] = f"random{self._next_random_id}"
+            event["status"] = "confirmed"
+            self._store(event)
+            return copy.deepcopy(event)
+        return self._call("insert", apply)
+
+    def _patch(self, event_id, body):
+        def apply():
+            event = self.events_by_id.get(event_id)
+            if event is None or event["status"] == "cancelled":
+                raise HttpError(404)
+            event.update(copy.deepcopy(body))
+            self._changes.append(event_id)
+            return copy.deepcopy(event)
+        return self._call("patch", apply)
+
+    def _delete(self, event_id):
+        def apply():
+            event = self.events_by_id.get(event_id)
+            if event is None:
+                raise HttpError(404)
+            if event["status"] == "cancelled":
+                raise HttpError(410)
+            event["status"] = "cancelled"
+            self._changes.append(event_id)
+            return ""
+        return self._call("delete", apply)
+
+    def _list(self, sync_token):
+        def apply():
+            if sync_token is None:
+                items = list(self.live_events().values())
+            else:
+                changed = dict.fromkeys(self._changes[int(sync_token):])
+                items = [self.events_by_id[event_id] for event_id in changed]
+            return {"items": copy.deepcopy(items), "nextSyncToken": str(len(self._changes))}
+        return self._call("list", apply)
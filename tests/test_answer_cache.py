@@ -0,0 +1,50 @@
+import pytest
+
+from helpers import answer_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    answer_cache.clear()
+    yield
+    answer_cache.clear()
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("what is supervised learning", "what is unsupervised learning"),
+    ("explain linear regression", "explain nonlinear regression"),
+    ("what is normalization", "what is denormalization"),
+    ("what is a prime number", "what is not a prime number"),
+])
+def test_questions_differing_by_a_word_do_not_share_answers(cached, asked):
+    answer_cache.store(cached, "cached answer")
+    assert answer_cache.lookup(asked) is None
+    assert answer_cache.lookup(cached) == "cached answer"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Explain Dijkstra's algorithm", "what is dijkstra algorithm?"),
+    ("What is a linked list?", "explain linked list"),
+    ("Please explain the binary search tree.", "what's a binary search tree"),
+])
+def test_rewordings_share_answers(cached, asked):
+    answer_cache.store(cached, "cached answer")
+    assert answer_cache.lookup(asked) == "cached answer"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("convert binary to decimal", "convert decimal to binary"),
+    ("what is 2 to the power 10", "what is 10 to the power 2"),
+    ("binary search tree", "tree, binary search"),
+    ("how to get from London to Paris", "how to get from Paris to London"),
+])
+def test_questions_with_the_same_words_in_another_order_do_not_collide(cached, asked):
+    answer_cache.store(cached, "cached answer")
+    assert answer_cache.lookup(asked) is None
+
+
+def test_punctuation_only_questions_are_not_cached():
+    answer_cache.store("what is it?", "cached answer")
+    assert answer_cache.lookup("what is that?") is None
+    answer_cache.store("?!", "cached answer")
+    assert answer_cache.stats()["entries"] == 1
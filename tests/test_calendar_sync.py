@@ -0,0 +1,192 @@
+import sqlite3
+import time
+
+import pytest
+
+from helpers import plan_store
+
+
+def make_task(**fields):
+    task = {"id": plan_store.new_task_id(), "date": "2026-01-05", "subject": "Maths", "priority": "High",
+            "start": "09:00:00", "end": "10:00:00", "done": False}
+    task.update(fields)
+    return task
+
+
+def outbox_rows(outbox):
+    with sqlite3.connect(outbox.OUTBOX_DB) as conn:
+        conn.row_factory = sqlite3.Row
+        return [dict(row) for row in conn.execute("SELECT * FROM outbox ORDER BY created_at")]
+
+
+def make_due(outbox):
+    with sqlite3.connect(outbox.OUTBOX_DB) as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = 0")
+
+
+def drain(outbox, calendar):
+    while outbox.drain_once(calendar):
+        pass
+
+
+# =================================================================================================
+# DRAINING
+# =================================================================================================
+def test_insert_update_and_delete_reach_the_calendar(outbox, calendar):
+    task = make_task()
+    outbox.enqueue_task("alice", task)
+    drain(outbox, calendar)
+    event = calendar.live_events()[task["id"]]     # the event id is the task id
+    assert event["summary"] == "[High] Study: Maths"
+    assert event["extendedProperties"]["private"]["studyBuddyUser"] == "alice"
+
+    outbox.enqueue_task_update("alice", dict(task, done=True))
+    drain(outbox, calendar)
+    assert calendar.live_events()[task["id"]]["summary"].startswith("✅ ")
+
+    outbox.enqueue("alice", "delete", task["id"])
+    drain(outbox, calendar)
+    assert calendar.live_events() == {}
+    assert outbox_rows(outbox) == []
+
+
+def test_operations_are_sent_in_batches(outbox, calendar):
+    for _ in range(120):
+        outbox.enqueue_task("alice", make_task())
+    drain(outbox, calendar)
+    assert calendar.batch_sizes == [50, 50, 20]
+    assert len(calendar.live_events()) == 120
+
+
+def test_insert_retried_after_a_lost_response_is_not_duplicated(outbox, calendar):
+    task = make_task()
+    outbox.enqueue_task("alice", task)
+    calendar.fail_next("insert", 503, applied=True)
+    outbox.drain_once(calendar)
+    assert outbox_rows(outbox)[0]["attempts"] == 1
+
+    make_due(outbox)
+    outbox.drain_once(calendar)     # the retry gets 409 and counts as done
+    assert list(calendar.live_events()) == [task["id"]]
+    assert outbox_rows(outbox) == []
+
+
+def test_deleting_a_missing_event_counts_as_done(outbox, calendar):
+    outbox.enqueue("alice", "delete", "doesnotexist")
+    outbox.drain_once(calendar)
+    assert outbox_rows(outbox) == []
+
+
+def test_updating_a_missing_event_recreates_it(outbox, calendar):
+    task = make_task()
+    outbox.enqueue_task_update("alice", task)
+    drain(outbox, calendar)
+    assert task["id"] in calendar.live_events()
+
+
+@pytest.mark.parametrize("status", [403, 429, 500, 503])
+def test_transient_errors_back_off(outbox, calendar, status):
+    outbox.enqueue_task("alice", make_task())
+    calendar.fail_next("insert", status)
+    outbox.drain_once(calendar)
+    [row] = outbox_rows(outbox)
+    assert row["status"] == "pending"
+    assert row["attempts"] == 1
+    assert row["next_attempt_at"] > time.time()
+    assert str(status) in row["last_error"]
+    assert outbox.drain_once(calendar) == 0     # not due again yet
+    assert calendar.live_events() == {}
+
+
+def test_backoff_grows_and_gives_up(outbox, calendar):
+    outbox.enqueue_task("alice", make_task())
+    delays = []
+    for _ in range(outbox.MAX_ATTEMPTS):
+        calendar.fail_next("insert", 500)
+        make_due(outbox)
+        outbox.drain_once(calendar)
+        [row] = outbox_rows(outbox)
+        delays.append(row["next_attempt_at"] - row["created_at"])
+    assert delays[3] > delays[0]
+    assert row["status"] == "failed"
+    assert outbox.outbox_status("alice") == {"pending": 0, "failed": 1}
+
+
+def test_bad_requests_fail_without_retrying(outbox, calendar):
+    outbox.enqueue_task("alice", make_task())
+    calendar.fail_next("insert", 400)
+    outbox.drain_once(calendar)
+    assert outbox_rows(outbox)[0]["status"] == "failed"
+
+
+def test_a_failed_batch_backs_off_every_operation(outbox, calendar):
+    for _ in range(3):
+        outbox.enqueue_task("alice", make_task())
+    calendar.batch_error = ConnectionError("network down")
+    outbox.drain_once(calendar)
+    assert [row["attempts"] for row in outbox_rows(outbox)] == [1, 1, 1]
+    make_due(outbox)
+    drain(outbox, calendar)
+    assert len(calendar.live_events()) == 3
+
+
+# =================================================================================================
+# RECONCILIATION
+# =================================================================================================
+def test_backfill_inserts_updates_and_deletes(outbox, calendar):
+    kept, ticked, removed = make_task(), make_task(subject="Physics"), make_task(subject="Chemistry")
+    plan_store.save_plan("alice", [kept, ticked, removed])
+    assert outbox.reconcile_user(calendar, "alice")["insert"] == 3
+    drain(outbox, calendar)
+
+    plan_store.save_plan("alice", [kept, dict(ticked, done=True)])
+    counts = outbox.reconcile_user(calendar, "alice")
+    assert (counts["update"], counts["delete"]) == (1, 1)
+    drain(outbox, calendar)
+    assert set(calendar.live_events()) == {kept["id"], ticked["id"]}
+    assert outbox.reconcile_user(calendar, "alice") == {"insert": 0, "update": 0, "delete": 0, "skipped": 0}
+
+
+def test_events_created_before_the_outbox_are_replaced_not_duplicated(outbox, calendar):
+    task = make_task()
+    old_id = calendar.add_untracked_event("[High] Study: Maths", "2026-01-05T09:00:00+05:30",
+                                          "2026-01-05T10:00:00+05:30")
+    unrelated = calendar.add_untracked_event("Dentist", "2026-01-05T09:00:00+05:30", "2026-01-05T10:00:00+05:30")
+    plan_store.save_plan("alice", [task])
+    outbox.reconcile_user(calendar, "alice")
+    drain(outbox, calendar)
+    assert set(calendar.live_events()) == {task["id"], unrelated}
+    assert old_id not in calendar.live_events()
+
+
+def test_tasks_without_times_are_skipped(outbox, calendar):
+    task, untimed = make_task(), make_task()
+    del untimed["start"], untimed["end"]
+    plan_store.save_plan("alice", [untimed, task])
+    counts = outbox.reconcile_user(calendar, "alice")
+    assert (counts["insert"], counts["skipped"]) == (1, 1)
+
+
+def test_one_failing_user_does_not_stop_the_others(outbox, calendar, monkeypatch):
+    plan_store.save_plan("alice", [make_task()])
+    plan_store.save_plan("bob", [make_task()])
+    real_load = plan_store.load_plan
+    monkeypatch.setattr(plan_store, "load_plan",
+                        lambda username: 1 / 0 if username == "alice" else real_load(username))
+    assert outbox.reconcile_all(calendar)["insert"] == 1
+    drain(outbox, calendar)
+    assert len(calendar.live_events()) == 1
+
+
+def test_failed_operations_are_queued_again_by_reconcile(outbox, calendar):
+    task = make_task()
+    plan_store.save_plan("alice", [task])
+    outbox.reconcile_user(calendar, "alice")
+    calendar.fail_next("insert", 400)
+    outbox.drain_once(calendar)
+    assert outbox.outbox_status("alice")["failed"] == 1
+
+    assert outbox.reconcile_user(calendar, "alice")["insert"] == 1
+    drain(outbox, calendar)
+    assert list(calendar.live_events()) == [task["id"]]
+    assert outbox.outbox_status("alice") == {"pending": 0, "failed": 0}
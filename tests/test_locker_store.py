@@ -0,0 +1,51 @@
+import io
+import os
+
+import pytest
+
+from helpers import locker_crypto, locker_store
+
+
+@pytest.fixture
+def key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return os.urandom(32)
+
+
+def write_orphan(key, blob_id="0" * 64):
+    """A blob as an upload leaves it when interrupted before its manifest is saved."""
+    os.makedirs(locker_store._blob_dir("alice"), exist_ok=True)
+    locker_crypto.encrypt_file(key, io.BytesIO(b"-orphaned"), locker_store._blob_path("alice", blob_id))
+    return locker_store._blob_path("alice", blob_id)
+
+
+class BrokenUpload(io.BytesIO):
+    def read(self, *args):
+        raise OSError("connection reset")
+
+
+def test_garbage_collection_removes_orphans_and_keeps_documents(key):
+    locker_store.put("alice", key, "notes.txt", io.BytesIO(b"notes " * 1000))
+    orphan = write_orphan(key)
+    freed = locker_store.collect_garbage("alice", key)
+    assert freed > 0 and not os.path.exists(orphan)
+    page, total = locker_store.list_documents("alice", key)
+    assert total == 1
+    with locker_store.open_document("alice", key, "notes.txt") as f:
+        assert f.read() == b"notes " * 1000
+
+
+def test_recent_temp_files_are_left_for_running_uploads(key):
+    tmp = write_orphan(key) + ".1-2.tmp"
+    os.rename(tmp[:-len(".1-2.tmp")], tmp)
+    assert locker_store.collect_garbage("alice", key) == 0
+    assert os.path.exists(tmp)
+
+
+def test_a_batch_with_failed_uploads_sweeps_orphans(key):
+    orphan = write_orphan(key)
+    results = locker_store.put_many("alice", key, [("good.txt", io.BytesIO(b"fine"), "text/plain"),
+                                                   ("bad.txt", BrokenUpload(b"x"), "text/plain")])
+    assert isinstance(results[1], OSError) and results[0]["size"] == 4
+    assert not os.path.exists(orphan)
+    assert locker_store.list_documents("alice", key)[1] == 1